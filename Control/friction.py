@@ -0,0 +1,168 @@
+"""
+Modelos de atrito e de saturação dos atuadores.
+
+O atrito de Coulomb, sign(omega), torna a EDO descontínua em omega = 0 e os
+solvers de passo adaptativo reduzem o passo indefinidamente ao redor dessa
+descontinuidade. Há duas formas de evitar isso:
+
+* suavização: sign(omega) é substituído por tanh(omega / smoothing), que é
+    contínuo e derivável, ao custo de um pequeno deslizamento na aderência
+* eventos: integrate_stick_slip() integra cada trecho de deslizamento com o
+    sentido do atrito fixo, o que torna a EDO suave, e interrompe a integração
+    com um evento do solve_ivp quando omega cruza zero. Nesse instante verifica
+    se o elo adere (omega = 0 até o torque aplicado superar o atrito estático)
+    ou inverte o sentido
+"""
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+
+class Atrito:
+    """Atrito de Coulomb, viscoso e de Stribeck em uma junta de revolução
+
+    F(omega) = (Fc + (Fs - Fc) exp(-(omega / vs)^2)) sign(omega) + b omega
+
+    * coulomb: torque de atrito de Coulomb Fc (N.m)
+    * static: torque de atrito estático Fs, por padrão igual a Fc (N.m)
+    * stribeck_velocity: velocidade de Stribeck vs (rad/s)
+    * viscous: coeficiente de atrito viscoso b (N.m.s/rad)
+    * smoothing: velocidade de suavização do sign(omega), 0 mantém o modelo
+        descontínuo, que deve ser integrado com integrate_stick_slip() (rad/s)
+    """
+
+    def __init__(
+        self,
+        coulomb=0.25,
+        static=None,
+        stribeck_velocity=0.1,
+        viscous=0.0,
+        smoothing=0.0,
+    ):
+        self.coulomb = coulomb
+        self.static = coulomb if static is None else static
+        self.stribeck_velocity = stribeck_velocity
+        self.viscous = viscous
+        self.smoothing = smoothing
+
+    def _magnitude(self, omega):
+        """Intensidade do atrito seco com o efeito de Stribeck"""
+        stribeck = np.exp(-((omega / self.stribeck_velocity) ** 2))
+        return self.coulomb + (self.static - self.coulomb) * stribeck
+
+    def _sign(self, omega):
+        if self.smoothing > 0:
+            return np.tanh(omega / self.smoothing)
+        return np.sign(omega)
+
+    def torque(self, omega):
+        """Torque de atrito que se opõe à velocidade omega"""
+        return self._magnitude(omega) * self._sign(omega) + self.viscous * omega
+
+    def derivative(self, omega):
+        """Derivada do torque de atrito em relação a omega, utilizada no Jacobiano.
+        No modelo descontínuo a derivada do sign(omega) é ignorada"""
+        vs = self.stribeck_velocity
+        d_magnitude = (
+            (self.static - self.coulomb)
+            * np.exp(-((omega / vs) ** 2))
+            * (-2 * omega / vs ** 2)
+        )
+        d_sign = 0.0
+        if self.smoothing > 0:
+            d_sign = (1 - np.tanh(omega / self.smoothing) ** 2) / self.smoothing
+        return (
+            d_magnitude * self._sign(omega)
+            + self._magnitude(omega) * d_sign
+            + self.viscous
+        )
+
+    def slip_torque(self, omega, direction):
+        """Torque de atrito durante o deslizamento no sentido 'direction' (+1 ou -1),
+        contínuo em omega inclusive em omega = 0"""
+        return direction * self._magnitude(omega) + self.viscous * omega
+
+    def sticks(self, applied):
+        """Se o elo parado permanece aderido sob o torque 'applied'"""
+        return abs(applied) <= self.static
+
+
+def saturate(value, limits, smoothing=0.0):
+    """Limita value ao intervalo limits = [mínimo, máximo]
+
+    Com smoothing > 0 a saturação é suave: as quinas são substituídas por
+    funções softplus de largura smoothing, e a função é derivável em todo ponto.
+    """
+    low, high = limits
+    if smoothing <= 0:
+        return max(low, min(value, high))
+    softplus = lambda x: smoothing * np.logaddexp(0.0, x / smoothing)
+    return value - softplus(value - high) + softplus(low - value)
+
+
+def integrate_stick_slip(
+    atrito, applied, inertia, t_span, y0, max_events=100, **options
+):
+    """Integra theta'' = (applied(t, theta) - F(omega)) / inertia com o atrito
+    descontínuo de 'atrito', tratando as transições de aderência e deslizamento
+    com eventos do solve_ivp
+
+    * applied: função (t, theta) do torque aplicado na junta, exceto o atrito
+    * t_span: intervalo (t0, tf) de integração
+    * y0: estado inicial [theta, omega]
+    * max_events: número máximo de transições de aderência e deslizamento
+    * options: demais argumentos do solve_ivp (method, rtol, atol, ...)
+
+    Retorna o estado [theta, omega] em tf. Caso tf não seja alcançado, por excesso
+    de eventos ou falha do solver, gera um RuntimeError em vez de retornar um
+    estado de um instante anterior.
+    """
+    t, tf = t_span
+    y = np.array(y0, dtype="float")
+    for _ in range(max_events):
+        if t >= tf:
+            break
+        direction = np.sign(y[1])
+        if direction == 0:
+            tau = applied(t, y[0])
+            if atrito.sticks(tau):
+                # Aderido: theta constante até o torque aplicado superar o estático
+                breakaway = lambda t, y: abs(applied(t, y[0])) - atrito.static
+                breakaway.terminal, breakaway.direction = True, 1
+                solution = solve_ivp(
+                    lambda t, y: [0.0, 0.0], (t, tf), y, events=breakaway, **options
+                )
+                t = solution.t[-1]
+                if solution.status == 0:
+                    break
+                if solution.status != 1:
+                    raise RuntimeError(
+                        "Falha na integração da aderência: " + solution.message
+                    )
+                tau = applied(t, y[0])
+            direction = np.sign(tau)
+
+        def f_slip(t, y, direction=direction):
+            theta, omega = y
+            return [
+                omega,
+                (applied(t, theta) - atrito.slip_torque(omega, direction)) / inertia,
+            ]
+
+        # O deslizamento termina quando omega cruza zero
+        stop = lambda t, y: y[1]
+        stop.terminal, stop.direction = True, -direction
+        solution = solve_ivp(f_slip, (t, tf), y, events=stop, **options)
+        if solution.status == -1:
+            raise RuntimeError(
+                "Falha na integração do deslizamento: " + solution.message
+            )
+        t, y = solution.t[-1], solution.y[:, -1].copy()
+        if solution.status == 1:
+            y[1] = 0.0
+    if t < tf:
+        raise RuntimeError(
+            "Integração interrompida em t = %g, antes de tf = %g, após %d eventos; "
+            "aumente max_events" % (t, tf, max_events)
+        )
+    return y
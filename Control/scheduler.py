@@ -0,0 +1,159 @@
+"""
+Escalonador de laços de controle em tempo real.
+
+Executa uma tarefa (por exemplo o passo do controlador e da planta) a uma taxa
+fixa, com prazos calculados a partir de um relógio monotônico, e registra em
+cada ciclo o atraso do início em relação ao prazo (jitter), o tempo de cálculo
+e se o ciclo terminou depois do prazo do ciclo seguinte.
+
+Políticas quando um ciclo ultrapassa o seu período (overrun):
+
+* "skip": os prazos perdidos são descartados e o próximo ciclo começa no
+    primeiro prazo futuro, mantendo a fase do laço
+* "catch_up": os ciclos atrasados são executados imediatamente em sequência,
+    mantendo o número de ciclos por segundo em média
+* "reset": o próximo prazo é contado a partir do fim do ciclo atrasado,
+    deslocando a fase do laço
+"""
+
+import math
+import time
+
+import numpy as np
+
+OVERRUN_POLICIES = ("skip", "catch_up", "reset")
+
+
+class Relatorio:
+    """Medidas de cada ciclo de uma execução do Escalonador, em segundos
+
+    * lateness: atraso do início de cada ciclo em relação ao seu prazo
+    * compute: tempo de cálculo de cada ciclo
+    * missed: se o ciclo terminou depois do início do período seguinte
+    * skipped: número de ciclos descartados pela política "skip"
+    """
+
+    def __init__(self, period, lateness, compute, missed, skipped):
+        self.period = period
+        self.lateness = lateness
+        self.compute = compute
+        self.missed = missed
+        self.skipped = skipped
+
+    def histogram(self, bins=20):
+        """Histograma do atraso de início (jitter), retorna (contagens, limites)"""
+        return np.histogram(self.lateness, bins=bins)
+
+    def summary(self):
+        """Dicionário com as estatísticas da execução"""
+        return {
+            "cycles": len(self.compute),
+            "misses": int(self.missed.sum()),
+            "skipped": self.skipped,
+            "compute_mean": float(self.compute.mean()),
+            "compute_max": float(self.compute.max()),
+            "compute_p99": float(np.percentile(self.compute, 99)),
+            "jitter_std": float(self.lateness.std()),
+            "jitter_max": float(self.lateness.max()),
+            "utilization": float(self.compute.mean() / self.period),
+        }
+
+    def print_summary(self, bins=10):
+        """Exibe as estatísticas e o histograma do jitter"""
+        s = self.summary()
+        print(
+            "Ciclos executados: %d (período de %.3f ms)"
+            % (s["cycles"], 1e3 * self.period)
+        )
+        print(
+            "Prazos perdidos: %d, ciclos descartados: %d" % (s["misses"], s["skipped"])
+        )
+        print(
+            "Tempo de cálculo (ms): médio %.4f, p99 %.4f, máximo %.4f, utilização %.1f%%"
+            % (
+                1e3 * s["compute_mean"],
+                1e3 * s["compute_p99"],
+                1e3 * s["compute_max"],
+                100 * s["utilization"],
+            )
+        )
+        print(
+            "Jitter (ms): desvio padrão %.4f, máximo %.4f"
+            % (1e3 * s["jitter_std"], 1e3 * s["jitter_max"])
+        )
+        counts, edges = self.histogram(bins)
+        width = max(counts.max(), 1)
+        for count, low, high in zip(counts, edges[:-1], edges[1:]):
+            bar = "#" * int(round(40 * count / width))
+            low, high = 1e3 * low, 1e3 * high
+            print("  %8.4f - %8.4f ms | %-40s %d" % (low, high, bar, count))
+
+
+class Escalonador:
+    """Executa uma tarefa periodicamente com prazos fixos
+
+    * period: período do laço (s)
+    * overrun: política quando um ciclo ultrapassa o período, ver OVERRUN_POLICIES
+    * spin: intervalo antes de cada prazo em que a espera é ativa em vez de
+        time.sleep(), cuja resolução depende do sistema operacional (s)
+    * clock: relógio monotônico utilizado, em segundos
+    """
+
+    def __init__(self, period, overrun="skip", spin=5e-4, clock=time.perf_counter):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(
+                "Política de overrun deve ser uma de %s" % (OVERRUN_POLICIES,)
+            )
+        self.period = float(period)
+        self.overrun = overrun
+        self.spin = spin
+        self.clock = clock
+
+    def _wait(self, deadline):
+        """Espera até o prazo, dormindo enquanto ele está distante"""
+        clock = self.clock
+        remaining = deadline - clock() - self.spin
+        if remaining > 0:
+            time.sleep(remaining)
+        while clock() < deadline:
+            pass
+
+    def run(self, task, cycles=None, duration=None):
+        """Executa task(k) a cada período até completar 'cycles' períodos ou
+        'duration' segundos, e retorna o Relatorio
+
+        k é o índice do prazo do ciclo, o número de períodos desde o início,
+        que avança mais de uma unidade quando ciclos são descartados.
+        """
+        if cycles is None:
+            cycles = int(math.ceil(duration / self.period))
+        period, clock = self.period, self.clock
+        lateness = np.empty(cycles)
+        compute = np.empty(cycles)
+        missed = np.zeros(cycles, dtype=bool)
+        skipped = 0
+
+        deadline = clock()
+        index = 0
+        k = 0
+        while index < cycles:
+            self._wait(deadline)
+            start = clock()
+            task(index)
+            end = clock()
+            lateness[k] = start - deadline
+            compute[k] = end - start
+
+            deadline += period
+            index += 1
+            if end > deadline:
+                missed[k] = True
+                if self.overrun == "skip":
+                    late_cycles = math.floor((end - deadline) / period) + 1
+                    deadline += late_cycles * period
+                    index += late_cycles
+                    skipped += late_cycles
+                elif self.overrun == "reset":
+                    deadline = end
+            k += 1
+        return Relatorio(period, lateness[:k], compute[:k], missed[:k], skipped)
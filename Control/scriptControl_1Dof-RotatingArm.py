@@ -8,12 +8,28 @@ Author: Fernando Henrique Fernandes
 email: nandohfernandes@gmail.com
 """
 
-from numpy import sin, cos, pi
+import argparse
+import math
+import os
+import sys
+from collections import namedtuple
+
+from numpy import sin, cos
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint, solve_ivp
-from scipy.misc import derivative
-import matplotlib.animation as animation
+from scipy.integrate import ode, odeint, solve_ivp
+
+# Módulos compartilhados com os scripts de simulação
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Simulation")
+)
+from recorder import Registro
+from friction import Atrito, integrate_stick_slip, saturate
+from scheduler import Escalonador, OVERRUN_POLICIES
+from trajectories import as_trajectory, TrajetoriaHarmonica
+
+
+# Parâmetros físicos do manipulador, tanto da planta quanto do modelo do controlador
+Parametros = namedtuple("Parametros", ["L", "R", "I", "M", "G"])
 
 
 class Manipulador1GdL:
@@ -24,13 +40,20 @@ class Manipulador1GdL:
         do braço manipulador.
     * theta_function: o estado alvo [theta, omega] que o controlador deve
         levar o manipulador, sendo theta a  funções que retornam
-        a posição angular em radianos.
+        a posição angular em radianos. Pode ser uma Trajetoria, que fornece
+        também a velocidade e a aceleração alvo, ou uma função do tempo, cujas
+        derivadas são calculadas numericamente.
+
+    Os parâmetros L, R, I, M e G são os da planta simulada. O controlador utiliza
+    o seu próprio modelo, model_params, que por padrão (None) acompanha o da planta,
+    inclusive após set_params(), e pode ser alterado para estudar a robustez a
+    erros de modelagem.
     """
 
     def __init__(
         self,
         init_state=[0, 0],
-        theta_function=lambda: 0,  # Função que define a posição angular em função do tempo
+        theta_function=lambda t: 0,  # Função que define a posição angular em função do tempo
         L=1.0,  # Compriemnto do braço (m)
         R=0.5,  # Distância até a Localização do C.M. do braço (m)
         I=0.12,  # Momento de inércia do braço (kg.m^2)
@@ -40,24 +63,40 @@ class Manipulador1GdL:
         lamb=5,  # Valor lambda da equação diferencial do erro
         sat=False,  # Caso exista saturação no motor
         sat_lim=[-8, 8],  # Limites de Saturação
-        friction=False,  # Caso considere o atrito no modelo
-        edo_method=0,  # Método de resolução da EDO (LSODA=0, RK45=1)
-        #     OBS.: LSODA é consideravelmente mais rápido,
-        #     principalmente no caso com atrito.
+        sat_smoothing=0.0,  # Largura da saturação suave, 0 = saturação abrupta
+        friction=False,  # Caso considere o atrito no modelo, True utiliza o atrito
+        #     de Coulomb de 0.25 N.m ou pode ser um objeto Atrito
+        edo_method=0,  # Método de resolução da EDO (LSODA=0, RK45=1,
+        #     DOPRI5 contínuo=2, RK4 de passo fixo=3)
+        #     OBS.: Com o atrito descontínuo o método 1 trata as
+        #     transições de aderência com eventos, os demais
+        #     devem utilizar um Atrito suavizado. Os métodos 2 e 3
+        #     não reiniciam o solver a cada passo.
+        substeps=4,  # Subpassos do RK4 de passo fixo em cada passo dt
         control=True,  # Se haverá o controle do manipulador, caso contrário
         #     apenas será emulado o comportamento sem atuação
         origin=(0, 0),
+        model_params=None,  # Parametros do modelo do controlador, None = da planta
+        disturbance=None,  # Função d(t) do torque de perturbação aplicado na planta
     ):
         self.control = control
         self.edo_method = edo_method
+        self.substeps = substeps
+        self._solver = None  # Solver persistente do método 2
         self.target_state = [0, 0]
         self.sat = sat
         self.sat_limit = sat_lim
-        self.friction = friction
+        self.sat_smoothing = sat_smoothing
+        if friction is True:
+            friction = Atrito(coulomb=0.25)
+        self.friction = friction or None
         self.lambda_ = lamb
         self.theta_function = theta_function
+        self.trajectory = as_trajectory(theta_function)
         self.init_state = np.asarray(init_state, dtype="float")
-        self.params = (L, R, I, M, G)
+        self.params = Parametros(L, R, I, M, G)
+        self.model_params = None if model_params is None else Parametros(*model_params)
+        self.disturbance = disturbance
         self.torque = T
         self.origin = origin
         self.time_elapsed = 0
@@ -70,32 +109,67 @@ class Manipulador1GdL:
         theta, omega = y
         (_, R, I, M, G) = self.params
         T = self.torque
+        if self.disturbance is not None:
+            T = T + self.disturbance(t)
         # Lista com a conversão da equação diferencial de 2 ordem por 2 de primeira ordem
         if self.friction:
             derivs = [
                 omega,
-                1 / I * (T - M * G * R * sin(theta) - 0.25 * np.sign(omega)),
+                (T - M * G * R * sin(theta) - self.friction.torque(omega)) / I,
             ]
         else:
             derivs = [omega, 1 / I * (T - M * G * R * sin(theta))]
         return derivs
 
+    # Torque aplicado na junta, exceto o atrito, utilizado na integração com eventos
+    def _applied_torque(self, t, theta):
+        (_, R, I, M, G) = self.params
+        T = self.torque
+        if self.disturbance is not None:
+            T = T + self.disturbance(t)
+        return T - M * G * R * math.sin(theta)
+
+    # Aceleração angular em escalares, utilizada pelo RK4 de passo fixo
+    def _alpha(self, t, theta, omega):
+        (_, R, I, M, G) = self.params
+        T = self.torque
+        if self.disturbance is not None:
+            T = T + self.disturbance(t)
+        alpha = (T - M * G * R * math.sin(theta)) / I
+        if self.friction:
+            alpha -= self.friction.torque(omega) / I
+        return alpha
+
+    # Jacobiano analítico da função utilizada pelo solver da EDO
+    def f_jac(self, t, y):
+        theta, omega = y
+        (_, R, I, M, G) = self.params
+        # Derivada do atrito, sem o impulso do sign(omega) em omega = 0
+        d_friction = self.friction.derivative(omega) if self.friction else 0
+        return [[0, 1], [-M * G * R * cos(theta) / I, -d_friction / I]]
+
     def get_params(self):
         """ Retorna os parâmetros atuais sendo usando no manipulador"""
         return self.params
 
     def set_params(self, parameters):
-        """ Atualiza os parâmetros atuais sendo usando no manipulador"""
-        self.params = parameters
+        """ Atualiza os parâmetros atuais sendo usando no manipulador (planta),
+        o modelo do controlador acompanha a planta, a menos que tenha sido definido
+        por set_model_params()"""
+        self.params = Parametros(*parameters)
+        self._solver = None
+
+    def set_model_params(self, parameters):
+        """ Atualiza os parâmetros do modelo utilizado pelo controlador,
+        sem alterar a planta. None volta a utilizar os da planta"""
+        self.model_params = None if parameters is None else Parametros(*parameters)
 
     def set_torque(self, t):
         """ Atualiza o parâmetro T (Torque) do manipulador, essa é a
             maneira que o controlador atua no manipulador, também limita
             o valor que pode ser definido caso exista saturação"""
         if self.sat:
-            sat0 = self.sat_limit[0]
-            satf = self.sat_limit[1]
-            self.torque = max(sat0, min(t, satf))
+            self.torque = saturate(t, self.sat_limit, self.sat_smoothing)
         else:
             self.torque = t
 
@@ -106,6 +180,18 @@ class Manipulador1GdL:
         y = np.cumsum([self.origin[1], -L * cos(self.state[0])])
         return (x, y)
 
+    def positions(self, thetas):
+        """Retorna as posições (x,y) da base e da ponta do manipulador para uma
+        trajetória inteira de thetas, no formato (T, 2, 2)"""
+        L = self.params[0]
+        thetas = np.asarray(thetas, dtype="float")
+        points = np.empty(thetas.shape + (2, 2))
+        points[..., :, 0] = self.origin[0]
+        points[..., :, 1] = self.origin[1]
+        points[..., 1, 0] += L * sin(thetas)
+        points[..., 1, 1] -= L * cos(thetas)
+        return points
+
     def target_position(self):
         """ Retorna a posição alvo (x,y) atual da ponta do manipulador"""
         L = self.params[0]
@@ -119,9 +205,9 @@ class Manipulador1GdL:
         theta_curr, omega_curr = self.state
 
         # Tranforma as funções alvo em valores alvo
-        theta_target = self.theta_function(self.time_elapsed)
-        omega_target = derivative(self.theta_function, self.time_elapsed, 1e-18)
-        alfa_target = derivative(self.theta_function, self.time_elapsed, 1e-18, 2)
+        theta_target, omega_target, alfa_target = self.trajectory.evaluate(
+            self.time_elapsed
+        )
         self.target_state[0] = theta_target
         self.target_state[1] = omega_target
 
@@ -131,8 +217,9 @@ class Manipulador1GdL:
         self.error[0] = theta_hat
         self.error[1] = omega_hat
 
-        # Define o Torque necessário
-        (_, R, I, M, G) = self.params
+        # Define o Torque necessário com o modelo do controlador
+        model = self.params if self.model_params is None else self.model_params
+        (_, R, I, M, G) = model
         lambda_ = self.lambda_
         torq = M * G * R * sin(theta_curr) + I * (
             alfa_target - 2 * lambda_ * omega_hat - (lambda_ ** 2) * theta_hat
@@ -150,9 +237,20 @@ class Manipulador1GdL:
         t0 = self.time_elapsed
         tf = t0 + dt
 
-        if self.edo_method == 0:
+        if self.edo_method == 2:
+            self._step_ode(t0, tf)
+        elif self.edo_method == 3:
+            self._step_rk4(dt)
+        elif self.edo_method == 0:
             # Solucionador padrão de EDO do Scipy - LSODA
-            self.state = odeint(self.f_ode, self.state, [t0, tf], tfirst=True)[1]
+            self.state = odeint(
+                self.f_ode, self.state, [t0, tf], Dfun=self.f_jac, tfirst=True
+            )[1]
+        elif self.friction and self.friction.smoothing == 0:
+            # Atrito descontínuo, com eventos nas transições de aderência
+            self.state = integrate_stick_slip(
+                self.friction, self._applied_torque, self.params.I, (t0, tf), self.state
+            )
         else:
             # Runge-Kutta 4 ordem
             kr45 = solve_ivp(self.f_ode, (t0, tf), self.state, t_eval=[tf])
@@ -161,44 +259,156 @@ class Manipulador1GdL:
         # print(self.state)
         self.time_elapsed += dt
 
+    def _step_ode(self, t0, tf):
+        """Avança o estado com um único objeto ode do Scipy, criado no primeiro
+        passo, em vez de reiniciar a integração a cada passo. O DOPRI5 termina
+        cada chamada exatamente em tf, assim o novo torque do controlador é
+        aplicado a partir do instante correto (o LSODA avança internamente
+        além de tf com o torque anterior)"""
+        solver = self._solver
+        if solver is None or solver.t != t0:
+            solver = ode(self.f_ode).set_integrator("dopri5")
+            solver.set_initial_value(self.state, t0)
+            self._solver = solver
+        state = solver.integrate(tf)
+        if solver.successful():
+            self.state = state
+        else:
+            # Com atrito o passo adaptativo pode travar na oscilação do sinal de
+            # omega em torno de zero, nesse caso o passo é feito com o RK4
+            self._solver = None
+            self._step_rk4(tf - t0)
+
+    def _step_rk4(self, dt):
+        """Avança o estado com o Runge-Kutta de 4ª ordem de passo fixo, em
+        escalares do Python e sem alocar nenhum array"""
+        h = dt / self.substeps
+        alpha = self._alpha
+        t = self.time_elapsed
+        theta, omega = float(self.state[0]), float(self.state[1])
+        for _ in range(self.substeps):
+            k1_t, k1_w = omega, alpha(t, theta, omega)
+            k2_t = omega + 0.5 * h * k1_w
+            k2_w = alpha(t + 0.5 * h, theta + 0.5 * h * k1_t, k2_t)
+            k3_t = omega + 0.5 * h * k2_w
+            k3_w = alpha(t + 0.5 * h, theta + 0.5 * h * k2_t, k3_t)
+            k4_t = omega + h * k3_w
+            k4_w = alpha(t + h, theta + h * k3_t, k4_t)
+            theta += h / 6 * (k1_t + 2 * k2_t + 2 * k3_t + k4_t)
+            omega += h / 6 * (k1_w + 2 * k2_w + 2 * k3_w + k4_w)
+            t += h
+        self.state[0] = theta
+        self.state[1] = omega
+
 
 # ------FUNÇÃO POSIÇÃO ANGULAR E INICIALIZAÇÃO DA CLASSE------#
-# Função que retorna a posição angular (em radianos) em função do tempo
-def f_t(t):
-    # angulo = np.deg2rad(30)
-    angulo = pi / 6 * (1 - cos(2 * pi * t)) + np.deg2rad(90)
-    # if t < 2:
-    #     angulo = np.deg2rad(30)
-    # elif t < 6:
-    #     angulo = np.deg2rad(180)
-    # elif t < 10:
-    #     angulo = np.deg2rad(-20)
-    # else:
-    #     angulo = np.deg2rad(-90)
-    return angulo
+# Trajetória da posição angular (em radianos) em função do tempo,
+# pi / 6 * (1 - cos(2 pi t)) + pi / 2, com as derivadas analíticas utilizadas
+# pelo controlador
+f_t = TrajetoriaHarmonica(np.pi / 2 + np.pi / 6, -np.pi / 6, 1.0)
+# Sequência de posições fixas, com as transições suavizadas por um spline:
+# f_t = TrajetoriaSpline(
+#     [0, 2, 6, 10, 14], np.deg2rad([30, 30, 180, -20, -90]), bc_type="clamped"
+# )
 
 
-# -------- EXECUÇÃO ---------#
-# Inicializa a classe
-manipulador = Manipulador1GdL(
-    [0, 0], f_t, edo_method=1, friction=False, control=True, lamb=10
-)
-dt = 1.0 / 30  # Intevalor de tempo  = 30 fps
-animate_model = True  # Se plotará a animação, caso contrário, apenas os gráficos
-tmin, tmax = [0, 10.0]  # Tempo mínimo e máximo
-torques = []  # Torques obtidos a cada iteração
-thetas = []  # Estados dos thetas a cada iteração
-thetas_hat = []  # Erros do thetas obtidos a cada iteração
-omegas = []  # Estados dos omegas a cada iteração
-omegas_hat = []  # Erros do omega obtidos a cada iteração
-times = []  # Tempo de cada iteração
+# ------ SIMULAÇÃO ------#
+# Grandezas registradas a cada passo da simulação e os seus formatos
+FIELDS = {"time": (), "state": 2, "target": 2, "torque": (), "error": 2}
+
+
+def run_simulation(manipulador, dt, t_max, window=None):
+    """Executa a simulação do manipulador até t_max com passos dt, sem nenhuma
+    dependência do matplotlib, e retorna o Registro com os resultados
+
+    * window: caso informado, mantém apenas os últimos 'window' passos
+    """
+    steps = int(round(t_max / dt))
+    if window is None:
+        registro = Registro(FIELDS, capacity=steps)
+    else:
+        registro = Registro(FIELDS, capacity=window, rolling=True)
+    for _ in range(steps):
+        manipulador.step(dt)
+        registro.append(
+            manipulador.time_elapsed,
+            manipulador.state,
+            manipulador.target_state,
+            manipulador.torque,
+            manipulador.error,
+        )
+    return registro
+
+
+def run_realtime(manipulador, dt, t_max, overrun="skip"):
+    """Executa a simulação em tempo real, um passo do controle a cada dt segundos
+    do relógio, e retorna o Registro com os resultados e o Relatorio do
+    escalonador com os tempos de cada ciclo"""
+    registro = Registro(FIELDS, capacity=int(round(t_max / dt)))
+
+    def cycle(k):
+        # Com ciclos descartados a planta avança até o prazo do ciclo atual
+        manipulador.step((k + 1) * dt - manipulador.time_elapsed)
+        registro.append(
+            manipulador.time_elapsed,
+            manipulador.state,
+            manipulador.target_state,
+            manipulador.torque,
+            manipulador.error,
+        )
+
+    escalonador = Escalonador(dt, overrun=overrun)
+    relatorio = escalonador.run(cycle, duration=t_max)
+    return registro, relatorio
+
 
 # ------ GRÁFICOS E ANIMAÇÃO ------#
-# Figura
-fig = plt.figure(figsize=(10, 5))
+def plot_results(resultado):
+    """Gráficos dos resultados de uma simulação já executada"""
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(10, 5))
+    grid = plt.GridSpec(4, 2, wspace=0.4, hspace=0.5)
+    pos_torq = grid[0, 0:]
+    pos_error = grid[1, 0:]
+    pos_error2 = grid[2, 0:]
+    pos_error3 = grid[3, 0:]
+
+    torq_ax = fig.add_subplot(pos_torq)
+    torq_ax.set_title("Torque x Tempo")
+
+    error_ax = fig.add_subplot(pos_error)
+    error_ax.set_title(r"[$\theta,\hat{\theta}$] x Tempo")
+
+    error2_ax = fig.add_subplot(pos_error2)
+    error2_ax.set_title(r"[$\dot{\theta},\dot{\hat{\theta}}$] x Tempo")
+
+    error3_ax = fig.add_subplot(pos_error3)
+    error3_ax.set_title(r"$\dot{\hat{\theta}}$ x $\hat{\theta}$")
 
-# Gráficos
-if animate_model:
+    # Desenha os Objetos
+    time_list = resultado.time
+    thetas, omegas = resultado.state.T
+    thetas_hat, omegas_hat = resultado.error.T
+    torq_ax.plot(time_list, resultado.torque, "r-", lw=2)
+    error_ax.plot(time_list, thetas, "g-", lw=2, label=r"$\theta$")
+    error_ax.plot(time_list, thetas_hat, "y-", lw=2, label=r"$\hat{\theta}$")
+    error2_ax.plot(time_list, omegas, "b-", lw=2, label=r"$\dot{\theta}$")
+    error2_ax.plot(
+        time_list, omegas_hat, "c-", lw=2, label=r"$\dot{\hat{\theta}}$"
+    )
+    error3_ax.plot(omegas_hat, thetas_hat, "m-", lw=2, label=r"$\dot{\hat{\theta}}$")
+    error_ax.legend()
+    error2_ax.legend()
+    return fig
+
+
+def animate_results(resultado, manipulador, dt):
+    """Animação dos resultados de uma simulação já executada, um quadro a cada dt"""
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    fig = plt.figure(figsize=(10, 5))
     # Posição dos Subplots com animação
     time_max = 8
     grid = plt.GridSpec(3, 6, wspace=0.5, hspace=0.6)
@@ -249,38 +459,10 @@ if animate_model:
     error_ax.legend()
     state_ax.legend()
 
-else:
-    grid = plt.GridSpec(4, 2, wspace=0.4, hspace=0.5)
-    pos_torq = grid[0, 0:]
-    pos_error = grid[1, 0:]
-    pos_error2 = grid[2, 0:]
-    pos_error3 = grid[3, 0:]
-
-    torq_ax = fig.add_subplot(pos_torq)
-    torq_ax.set_title("Torque x Tempo")
-
-    error_ax = fig.add_subplot(pos_error)
-    error_ax.set_title(r"[$\theta,\hat{\theta}$] x Tempo")
-
-    error2_ax = fig.add_subplot(pos_error2)
-    error2_ax.set_title(r"[$\dot{\theta},\dot{\hat{\theta}}$] x Tempo")
-
-    error3_ax = fig.add_subplot(pos_error3)
-    error3_ax.set_title(r"$\dot{\hat{\theta}}$ x $\hat{\theta}$")
-
-
-def init():
-    """initialize animation"""
-    line_anim.set_data([], [])
-    line_ideal.set_data([], [])
-    line_torq.set_data([], [])
-    line_state_theta.set_data([], [])
-    line_state_omega.set_data([], [])
-    line_error_theta.set_data([], [])
-    line_error_omega.set_data([], [])
-    time_text.set_text("")
-
-    return (
+    # Posições do manipulador e do alvo em toda a simulação
+    positions = manipulador.positions(resultado.state[:, 0])
+    target_positions = manipulador.positions(resultado.target[:, 0])
+    lines = (
         line_anim,
         line_ideal,
         line_torq,
@@ -291,94 +473,95 @@ def init():
         time_text,
     )
 
-
-def animate(i):
-    """perform animation step"""
-    global manipulador, dt, torques, thetas_hat, omegas_hat, times, torq_ax, error_ax, state_ax
-
-    manipulador.step(dt)
-
-    # Atualiza os dados
-    t_ = manipulador.time_elapsed
-    thetas.append(manipulador.state[0])
-    thetas_hat.append(manipulador.error[0])
-    omegas.append(manipulador.state[1])
-    omegas_hat.append(manipulador.error[1])
-    torques.append(manipulador.torque)
-    times.append(t_)
-    xmin, xmax = torq_ax.get_xlim()
-
-    # Ajusta o eixo do tempo, x
-    if t_ > xmax:
-        torq_ax.set_xlim((xmin, xmax * 2))
-        state_ax.set_xlim((xmin, xmax * 2))
-        error_ax.set_xlim((xmin, xmax * 2))
-        error_ax.figure.canvas.draw()
-
-    # Atualiza os objetos desenhados com os dados obtidos
-    line_anim.set_data(*manipulador.position())
-    line_ideal.set_data(*manipulador.target_position())
-    line_torq.set_data(times, torques)
-    line_state_theta.set_data(times, thetas)
-    line_state_omega.set_data(times, omegas)
-    line_error_theta.set_data(times, omegas_hat)
-    line_error_omega.set_data(times, thetas_hat)
-    time_text.set_text("Tempo = %.1f" % manipulador.time_elapsed)
-
-    return (
-        line_anim,
-        line_ideal,
-        line_torq,
-        line_state_theta,
-        line_state_omega,
-        line_error_theta,
-        line_error_omega,
-        time_text,
+    def init():
+        """initialize animation"""
+        for line in lines[:-1]:
+            line.set_data([], [])
+        time_text.set_text("")
+        return lines
+
+    def animate(i):
+        """perform animation step"""
+        times = resultado.time[: i + 1]
+        t_ = times[-1]
+        xmin, xmax = torq_ax.get_xlim()
+
+        # Ajusta o eixo do tempo, x
+        if t_ > xmax:
+            torq_ax.set_xlim((xmin, xmax * 2))
+            state_ax.set_xlim((xmin, xmax * 2))
+            error_ax.set_xlim((xmin, xmax * 2))
+            error_ax.figure.canvas.draw()
+
+        # Atualiza os objetos desenhados com os dados obtidos
+        line_anim.set_data(positions[i, :, 0], positions[i, :, 1])
+        line_ideal.set_data(target_positions[i, :, 0], target_positions[i, :, 1])
+        line_torq.set_data(times, resultado.torque[: i + 1])
+        line_state_theta.set_data(times, resultado.state[: i + 1, 0])
+        line_state_omega.set_data(times, resultado.state[: i + 1, 1])
+        line_error_theta.set_data(times, resultado.error[: i + 1, 0])
+        line_error_omega.set_data(times, resultado.error[: i + 1, 1])
+        time_text.set_text("Tempo = %.1f" % t_)
+        return lines
+
+    return animation.FuncAnimation(
+        fig,
+        animate,
+        frames=len(resultado.time),
+        interval=1000 * dt,
+        blit=True,
+        init_func=init,
     )
 
 
-if animate_model:
-    # Animação e Simulação dos Resultados
-    from time import time
-
-    t0 = time()
-    animate(0)
-    t1 = time()
-    interval = 1000 * dt - (
-        t1 - t0
-    )  # Intervalo baseado em dt e no tempo para se calcular um passo
-
-    ani = animation.FuncAnimation(
-        fig, animate, frames=300, interval=interval, blit=True, init_func=init
-    )
-else:
-    # Gráficos dos Resultados
-    time_list = np.arange(tmin, tmax, dt)
-    for deltat in time_list:
-        manipulador.step(dt)
-        thetas.append(manipulador.state[0])
-        thetas_hat.append(manipulador.error[0])
-        omegas.append(manipulador.state[1])
-        omegas_hat.append(manipulador.error[1])
-        torques.append(manipulador.torque)
-
-    # Desenha os Objetos
-    (line_torq,) = torq_ax.plot(time_list, torques, "r-", lw=2)
-    (line_theta,) = error_ax.plot(time_list, thetas, "g-", lw=2, label=r"$\theta$")
-    (line_error_theta,) = error_ax.plot(
-        time_list, thetas_hat, "y-", lw=2, label=r"$\hat{\theta}$"
-    )
-    (line_omega,) = error2_ax.plot(
-        time_list, omegas, "b-", lw=2, label=r"$\dot{\theta}$"
+# -------- EXECUÇÃO ---------#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Controle do manipulador de 1 GdL")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="apenas executa a simulação e exibe um resumo, sem gráficos",
     )
-    (line_error_omega,) = error2_ax.plot(
-        time_list, omegas_hat, "c-", lw=2, label=r"$\dot{\hat{\theta}}$"
+    parser.add_argument(
+        "--realtime",
+        type=float,
+        metavar="HZ",
+        help="executa o laço de controle em tempo real nessa frequência e exibe "
+        "os tempos de cálculo, prazos perdidos e jitter",
     )
-    (line_erros_omega_theta,) = error3_ax.plot(
-        omegas_hat, thetas_hat, "m-", lw=2, label=r"$\dot{\hat{\theta}}$"
+    parser.add_argument(
+        "--overrun",
+        choices=OVERRUN_POLICIES,
+        default="skip",
+        help="política do laço em tempo real quando um ciclo ultrapassa o período",
     )
-    error_ax.legend()
-    error2_ax.legend()
-
-plt.show()
+    args = parser.parse_args()
 
+    # Inicializa a classe
+    manipulador = Manipulador1GdL(
+        [0, 0], f_t, edo_method=1, friction=False, control=True, lamb=10
+    )
+    dt = 1.0 / 30  # Intevalor de tempo  = 30 fps
+    animate_model = True  # Se plotará a animação, caso contrário, apenas os gráficos
+    tmin, tmax = [0, 10.0]  # Tempo mínimo e máximo
+
+    if args.realtime:
+        dt = 1.0 / args.realtime
+        resultado, relatorio = run_realtime(manipulador, dt, tmax - tmin, args.overrun)
+        relatorio.print_summary()
+    else:
+        resultado = run_simulation(manipulador, dt, tmax - tmin)
+    if args.headless:
+        print("Passos simulados:", len(resultado.time))
+        print("Erro máximo de theta (rad):", np.abs(resultado.error[:, 0]).max())
+        print("Torque máximo (N.m):", np.abs(resultado.torque).max())
+    else:
+        import matplotlib.pyplot as plt
+
+        if animate_model:
+            # Animação dos Resultados
+            ani = animate_results(resultado, manipulador, dt)
+        else:
+            # Gráficos dos Resultados
+            plot_results(resultado)
+        plt.show()
@@ -0,0 +1,236 @@
+"""
+Varreduras de parâmetros dos manipuladores em paralelo.
+
+Executa simulações em malha fechada para uma lista de casos, cada um um
+dicionário de parâmetros, distribuídas entre os processos de um
+ProcessPoolExecutor, e agrega as estatísticas do erro de rastreamento e do
+torque de cada caso em arrays do NumPy.
+
+Os casos são gerados por grid() (produto cartesiano de valores) ou por
+perturbations() (variações aleatórias em torno dos valores nominais). Cada
+processo carrega os scripts e o modelo dinâmico uma única vez e os reutiliza
+em todos os seus casos, os casos são enviados em lotes para reduzir a
+comunicação entre os processos.
+"""
+
+import argparse
+import importlib.util
+import inspect
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CONTROL_DIR = os.path.dirname(os.path.realpath(__file__))
+SIMULATION_DIR = os.path.join(CONTROL_DIR, "..", "Simulation")
+
+# Módulos dos scripts e manipuladores carregados em cada processo
+_modules = {}
+_manipuladores = {}
+
+
+def _load_script(name, path):
+    """Carrega um script (cujo nome não é um módulo válido) uma vez por processo"""
+    if name not in _modules:
+        for directory in (CONTROL_DIR, SIMULATION_DIR):
+            if directory not in sys.path:
+                sys.path.append(directory)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+STATISTICS = ("error_max", "error_rms", "error_final", "torque_max", "torque_rms")
+
+
+def _statistics(error, torque):
+    """Estatísticas do erro de posição (T, n) e do torque (T, n) de uma simulação,
+    com None (simulação que falhou) todas são NaN"""
+    if error is None:
+        return dict.fromkeys(STATISTICS, np.nan)
+    return {
+        "error_max": np.abs(error).max(),
+        "error_rms": np.sqrt(np.mean(error ** 2)),
+        "error_final": np.abs(error[-1]).max(),
+        "torque_max": np.abs(torque).max(),
+        "torque_rms": np.sqrt(np.mean(torque ** 2)),
+    }
+
+
+def simulate_rotating_arm(case):
+    """Simula o manipulador de 1 GdL controlado com os parâmetros do caso
+
+    O caso contém os argumentos de Manipulador1GdL (L, R, I, M, G, lamb, ...) e,
+    opcionalmente, dt e t_max. A referência é a trajetória f_t do script.
+    Os parâmetros L, R, I, M e G são os da planta, o controlador mantém os valores
+    padrão de Manipulador1GdL como modelo nominal, a menos que o caso informe
+    model_params.
+    """
+    script = _load_script(
+        "controle_1gdl", os.path.join(CONTROL_DIR, "scriptControl_1Dof-RotatingArm.py")
+    )
+    case = dict(case)
+    dt = case.pop("dt", 1.0 / 30)
+    t_max = case.pop("t_max", 10.0)
+    defaults = inspect.signature(script.Manipulador1GdL).parameters
+    nominal = script.Parametros(
+        *[defaults[n].default for n in script.Parametros._fields]
+    )
+    kwargs = dict(
+        init_state=[0, 0], theta_function=script.f_t, edo_method=3, model_params=nominal
+    )
+    kwargs.update(case)
+    registro = script.run_simulation(script.Manipulador1GdL(**kwargs), dt, t_max)
+    return _statistics(registro.error[:, :1], registro.torque)
+
+
+def simulate_scara(case):
+    """Simula o SCARA com controle por torque computado com os parâmetros do caso
+
+    O caso contém os parâmetros do modelo (L1, L2, R1, R2, I1, I2, M1, M2, G),
+    o estado inicial init_state em graus, o ganho lamb e, opcionalmente, t_max.
+    A referência é um polinômio de 5º grau de [0, 0] até [pi/2, -pi/2] em 2 s.
+    Como no manipulador de 1 GdL, os parâmetros são os da planta e o controle
+    utiliza os valores padrão como modelo nominal. Caso a integração falhe, as
+    estatísticas do caso são NaN.
+    """
+    scara = _load_script(
+        "simulacao_scara",
+        os.path.join(SIMULATION_DIR, "scriptSimulation_2Dof-Scara.py"),
+    )
+    from trajectories import PolinomioQuintico
+
+    # O manipulador, e com ele o modelo compilado, é criado uma vez por processo
+    if "scara" not in _manipuladores:
+        _manipuladores["scara"] = scara.Manipulador2GdL(edo_method="LSODA")
+    manipulador = _manipuladores["scara"]
+
+    case = dict(case)
+    t_max = case.pop("t_max", 4.0)
+    lamb = case.pop("lamb", 5)
+    init_state = case.pop("init_state", [0, 0, 0, 0])
+    names = ("L1", "L2", "R1", "R2", "I1", "I2", "M1", "M2", "G")
+    signature = inspect.signature(scara.Manipulador2GdL).parameters
+    defaults = [signature[n].default for n in names]
+    params = [case.pop(n, d) for n, d in zip(names, defaults)]
+    if case:
+        raise ValueError("Parâmetros desconhecidos: %s" % list(case))
+
+    reference = PolinomioQuintico([0, 0], [np.pi / 2, -np.pi / 2], 2.0)
+    manipulador.init_state = np.deg2rad(np.asarray(init_state, dtype="float"))
+    manipulador.set_params(params)
+    manipulador.set_model_params(defaults)
+    manipulador.set_control(reference, lamb=lamb)
+    # solve_edo() não propaga os erros e mantém a solução do caso anterior
+    manipulador.solution_edo = False
+    manipulador.solve_edo(t_max)
+    if not manipulador.solution_edo or len(manipulador.thetas_1) != len(manipulador.time):
+        return _statistics(None, None)
+
+    q = np.stack([manipulador.thetas_1, manipulador.thetas_2], axis=-1)
+    error = q - reference.evaluate(manipulador.time)[0]
+    # Torques recalculados nos instantes da solução a partir dos estados
+    states = np.concatenate(
+        [q, np.stack([manipulador.omegas_1, manipulador.omegas_2], axis=-1)], axis=-1
+    )
+    torque = np.array(
+        [manipulador.computed_torque(t, y) for t, y in zip(manipulador.time, states)]
+    )
+    return _statistics(error, torque)
+
+
+def _run_chunk(simulate, cases):
+    """Executa um lote de casos em um processo"""
+    return [simulate(case) for case in cases]
+
+
+def grid(**values):
+    """Casos do produto cartesiano dos valores de cada parâmetro,
+    grid(lamb=[5, 10], R=[0.4, 0.5]) gera 4 casos"""
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values.values())]
+
+
+def perturbations(nominal, relative, n, seed=None):
+    """Casos aleatórios em torno dos valores nominais
+
+    * nominal: dicionário com os valores nominais dos parâmetros
+    * relative: dicionário com a variação relativa máxima de cada parâmetro, os
+        valores são sorteados uniformemente em nominal * (1 +- relative)
+    * n: número de casos
+    """
+    rng = np.random.default_rng(seed)
+    cases = [dict(nominal) for _ in range(n)]
+    for name, spread in relative.items():
+        factors = rng.uniform(1 - spread, 1 + spread, n)
+        for case, factor in zip(cases, factors):
+            case[name] = nominal[name] * factor
+    return cases
+
+
+def run_sweep(simulate, cases, workers=None, chunksize=None):
+    """Executa simulate(case) para todos os casos em paralelo
+
+    * simulate: função de nível de módulo (para ser enviada aos processos) que
+        retorna um dicionário de estatísticas escalares
+    * workers: número de processos, por padrão o número de núcleos
+    * chunksize: casos por lote, por padrão 4 lotes por processo
+
+    Retorna um dicionário de arrays, um elemento por caso, com os parâmetros
+    numéricos dos casos e as estatísticas retornadas por simulate.
+    """
+    cases = list(cases)
+    workers = workers or os.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, -(-len(cases) // (4 * workers)))
+    # O primeiro caso é executado neste processo, o que também garante que o
+    # modelo esteja no cache em disco antes de iniciar os demais processos
+    results = [simulate(cases[0])]
+    chunks = [cases[i : i + chunksize] for i in range(1, len(cases), chunksize)]
+    if chunks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_chunk, simulate, c) for c in chunks]
+            for future in futures:
+                results.extend(future.result())
+
+    table = {}
+    for name in cases[0]:
+        column = [case.get(name) for case in cases]
+        if all(np.ndim(v) == 0 and isinstance(v, (int, float)) for v in column):
+            table[name] = np.array(column, dtype="float")
+    for name in results[0]:
+        table[name] = np.array([r[name] for r in results])
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Varredura de parâmetros em paralelo")
+    parser.add_argument("--workers", type=int, default=None, help="número de processos")
+    parser.add_argument("--cases", type=int, default=64, help="casos aleatórios")
+    parser.add_argument("--scara", action="store_true", help="varre o SCARA")
+    args = parser.parse_args()
+
+    if args.scara:
+        nominal = dict(M2=0.8, I2=0.25, lamb=5)
+        cases = perturbations(nominal, {"M2": 0.3, "I2": 0.3}, args.cases, seed=0)
+        simulate = simulate_scara
+    else:
+        nominal = dict(R=0.5, I=0.12, M=1.0, lamb=10)
+        cases = perturbations(
+            nominal, {"R": 0.2, "I": 0.2, "M": 0.2}, args.cases, seed=0
+        )
+        simulate = simulate_rotating_arm
+
+    initial_time = time.time()
+    table = run_sweep(simulate, cases, workers=args.workers)
+    print("Casos simulados: %d em %.2f s" % (len(cases), time.time() - initial_time))
+    for name, values in table.items():
+        print(
+            "%-12s mín %10.4f  média %10.4f  máx %10.4f"
+            % (name, values.min(), values.mean(), values.max())
+        )
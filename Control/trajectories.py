@@ -0,0 +1,406 @@
+"""
+Trajetórias de referência para os controladores.
+
+Cada trajetória fornece a posição, a velocidade e a aceleração alvo em uma única
+chamada evaluate(t), com t escalar ou um array de instantes, no lugar das
+derivadas numéricas calculadas a cada passo do controle. Para trajetórias com
+mais de uma junta, os valores têm o formato t.shape + (n,).
+
+Além das trajetórias gerais (simbólica, spline, numérica e harmônica), há os perfis ponto a
+ponto usuais: polinômios cúbicos e quínticos, perfis de velocidade trapezoidal e
+em curva S, e trechos cúbicos entre pontos de via. Os seus coeficientes são
+calculados na criação e a avaliação é vetorizada, de forma que a referência de
+uma simulação inteira pode ser obtida de uma só vez.
+"""
+
+import numpy as np
+
+
+def _stack(values, shape):
+    """Empilha os valores de cada junta no último eixo, expandindo as constantes
+    para o formato de t"""
+    return np.stack([np.broadcast_to(v, shape) for v in values], axis=-1)
+
+
+def _hold(t, start, end, q, qd, qdd):
+    """Zera a velocidade e a aceleração fora do intervalo [start, end], onde a
+    posição é mantida no seu valor inicial ou final"""
+    moving = (t >= start) & (t <= end)
+    moving = np.reshape(
+        moving, np.shape(moving) + (1,) * (np.ndim(qd) - np.ndim(moving))
+    )
+    return q[()], (qd * moving)[()], (qdd * moving)[()]
+
+
+class Trajetoria:
+    """Interface das trajetórias de referência
+
+    As subclasses implementam evaluate(t), que retorna (q, qd, qdd). Chamar a
+    trajetória retorna apenas a posição, de forma que ela também pode ser usada
+    onde uma função theta(t) é esperada.
+    """
+
+    def evaluate(self, t):
+        raise NotImplementedError
+
+    def __call__(self, t):
+        return self.evaluate(t)[0]
+
+
+class TrajetoriaSimbolica(Trajetoria):
+    """Trajetória definida por uma expressão do Sympy em função do tempo
+
+    * expr: expressão da posição, ou lista de expressões para várias juntas
+    * t: símbolo do tempo, caso seja omitido é o único símbolo livre de expr
+
+    As derivadas são calculadas simbolicamente e as três expressões são
+    lambdificadas uma única vez, na criação da trajetória.
+    """
+
+    def __init__(self, expr, t=None):
+        from sympy import lambdify, sympify
+
+        self.multiple = isinstance(expr, (list, tuple))
+        exprs = [sympify(e) for e in (expr if self.multiple else [expr])]
+        if t is None:
+            symbols = set().union(*[e.free_symbols for e in exprs])
+            if len(symbols) > 1:
+                raise ValueError("Informe o símbolo do tempo entre %s" % symbols)
+            t = symbols.pop() if symbols else sympify("t")
+        self.expr = exprs if self.multiple else exprs[0]
+        derivatives = [exprs, [e.diff(t) for e in exprs], [e.diff(t, 2) for e in exprs]]
+        self._function = lambdify(t, derivatives, modules="numpy", cse=True)
+
+    def evaluate(self, t):
+        values = self._function(t)
+        if self.multiple:
+            return tuple(_stack(v, np.shape(t)) for v in values)
+        if np.ndim(t) == 0:
+            return tuple(v[0] for v in values)
+        return tuple(np.broadcast_to(v[0], np.shape(t)) for v in values)
+
+
+class TrajetoriaSpline(Trajetoria):
+    """Trajetória interpolada por um spline cúbico entre pontos (tempo, posição)
+
+    * times: instantes dos pontos, em ordem crescente
+    * positions: posições nos pontos, no formato (T,) ou (T, n) para n juntas
+    * bc_type: condição de contorno do scipy.interpolate.CubicSpline, por padrão
+        velocidade nula no início e no fim
+
+    Antes do primeiro e após o último ponto a posição é mantida.
+    """
+
+    def __init__(self, times, positions, bc_type="clamped"):
+        from scipy.interpolate import CubicSpline
+
+        self.spline = CubicSpline(times, positions, bc_type=bc_type)
+
+    def evaluate(self, t):
+        start, end = self.spline.x[0], self.spline.x[-1]
+        t_clip = np.clip(t, start, end)
+        return _hold(t, start, end, *[self.spline(t_clip, nu) for nu in range(3)])
+
+
+class PontosDeVia(TrajetoriaSpline):
+    """Trajetória por trechos cúbicos que passa pelos pontos de via
+
+    * times: instantes dos pontos, em ordem crescente
+    * positions: posições nos pontos, no formato (T,) ou (T, n) para n juntas
+    * velocities: velocidades nos pontos. Caso sejam omitidas, são nulas nos
+        extremos e a média das inclinações dos trechos vizinhos nos pontos
+        intermediários, ou nulas quando as inclinações têm sinais opostos
+
+    Ao contrário do spline cúbico, cada trecho depende apenas dos seus pontos
+    extremos, porém a aceleração é descontínua nos pontos de via.
+    """
+
+    def __init__(self, times, positions, velocities=None):
+        from scipy.interpolate import CubicHermiteSpline
+
+        times = np.asarray(times, dtype="float")
+        positions = np.asarray(positions, dtype="float")
+        if velocities is None:
+            shape = (-1,) + (1,) * (positions.ndim - 1)
+            slopes = np.diff(positions, axis=0) / np.diff(times).reshape(shape)
+            velocities = np.zeros_like(positions)
+            same_sign = np.sign(slopes[:-1]) == np.sign(slopes[1:])
+            velocities[1:-1] = np.where(same_sign, (slopes[:-1] + slopes[1:]) / 2, 0)
+        self.spline = CubicHermiteSpline(times, positions, velocities)
+
+
+class TrajetoriaNumerica(Trajetoria):
+    """Trajetória de uma função qualquer theta(t), com as derivadas calculadas
+    por diferenças centrais de passo h
+
+    Alternativa para funções sem expressão simbólica, o passo padrão equilibra o
+    erro de truncamento e o de arredondamento da segunda derivada.
+    """
+
+    def __init__(self, function, h=1e-4):
+        self.function = function
+        self.h = h
+
+    def evaluate(self, t):
+        f, h = self.function, self.h
+        q = f(t)
+        q_next = f(t + h)
+        q_prev = f(t - h)
+        return q, (q_next - q_prev) / (2 * h), (q_next - 2 * q + q_prev) / h ** 2
+
+
+class TrajetoriaHarmonica(Trajetoria):
+    """Oscilação q(t) = center + amplitude cos(2 pi frequency t + phase), com as
+    derivadas analíticas
+
+    * center, amplitude, phase: em radianos, escalares ou um valor por junta
+    * frequency: em Hz, escalar ou uma por junta
+
+    Depende apenas do NumPy, ao contrário da TrajetoriaSimbolica, e pode ser
+    criada na importação dos scripts sem carregar o Sympy.
+    """
+
+    def __init__(self, center, amplitude, frequency, phase=0.0):
+        values = [center, amplitude, frequency, phase]
+        values = np.broadcast_arrays(*[np.asarray(v, dtype="float") for v in values])
+        self.multiple = values[0].ndim > 0
+        self.center, self.amplitude, frequency, self.phase = values
+        self.omega = 2 * np.pi * frequency
+
+    def evaluate(self, t):
+        t = np.asarray(t, dtype="float")
+        if self.multiple:
+            t = t[..., None]
+        angle = self.omega * t + self.phase
+        cos, sin = np.cos(angle), np.sin(angle)
+        q = self.center + self.amplitude * cos
+        qd = -self.amplitude * self.omega * sin
+        qdd = -self.amplitude * self.omega ** 2 * cos
+        return q[()], qd[()], qdd[()]
+
+
+def as_trajectory(function):
+    """Retorna a própria trajetória, ou uma TrajetoriaNumerica caso 'function'
+    seja apenas uma função do tempo"""
+    if isinstance(function, Trajetoria):
+        return function
+    return TrajetoriaNumerica(function)
+
+
+class _Perfil(Trajetoria):
+    """Base dos perfis ponto a ponto, de q0 até qf entre t0 e t0 + T
+
+    As subclasses definem a duração self.T e implementam _profile(tau), que
+    retorna (q, qd, qdd) no formato tau.shape + (n,) para tau em [0, T].
+    """
+
+    def _setup(self, q0, qf, t0):
+        self.scalar = np.ndim(q0) == 0 and np.ndim(qf) == 0
+        self.q0, self.qf = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(q0, dtype="float")),
+            np.atleast_1d(np.asarray(qf, dtype="float")),
+        )
+        self.t0 = t0
+
+    def evaluate(self, t):
+        t = np.asarray(t, dtype="float")
+        tau = np.clip(t - self.t0, 0, self.T)[..., None]
+        values = _hold(t, self.t0, self.t0 + self.T, *self._profile(tau))
+        if self.scalar:
+            return tuple(v[..., 0][()] for v in values)
+        return values
+
+
+class _PerfilPolinomial(_Perfil):
+    """Perfil polinomial, com os coeficientes da posição e das derivadas
+    calculados na criação e avaliados pelo método de Horner"""
+
+    def _set_coefficients(self, coefficients):
+        # Coeficientes no formato (grau + 1, n), do termo constante ao de maior grau
+        c = np.asarray(coefficients)
+        powers = np.arange(len(c))[:, None]
+        self.coefficients = (c, (c * powers)[1:], (c * powers * (powers - 1))[2:])
+
+    def _profile(self, tau):
+        values = []
+        for c in self.coefficients:
+            value = np.zeros(tau.shape[:-1] + c.shape[1:])
+            for ck in c[::-1]:
+                value = value * tau + ck
+            values.append(value)
+        return values
+
+
+class PolinomioCubico(_PerfilPolinomial):
+    """Polinômio cúbico de q0 até qf em um tempo T, a partir de t0, com as
+    velocidades v0 e vf nos extremos"""
+
+    def __init__(self, q0, qf, T, t0=0.0, v0=0.0, vf=0.0):
+        self._setup(q0, qf, t0)
+        self.T = float(T)
+        D = self.qf - self.q0
+        v0, vf = np.broadcast_arrays(v0, vf, D)[:2]
+        self._set_coefficients(
+            [
+                self.q0,
+                v0,
+                (3 * D - (2 * v0 + vf) * T) / T ** 2,
+                (-2 * D + (v0 + vf) * T) / T ** 3,
+            ]
+        )
+
+
+class PolinomioQuintico(_PerfilPolinomial):
+    """Polinômio de 5º grau de q0 até qf em um tempo T, a partir de t0, com as
+    velocidades v0 e vf e as acelerações a0 e af nos extremos"""
+
+    def __init__(self, q0, qf, T, t0=0.0, v0=0.0, vf=0.0, a0=0.0, af=0.0):
+        self._setup(q0, qf, t0)
+        self.T = float(T)
+        D = self.qf - self.q0
+        v0, vf, a0, af = np.broadcast_arrays(v0, vf, a0, af, D)[:4]
+        self._set_coefficients(
+            [
+                self.q0,
+                v0,
+                a0 / 2,
+                (20 * D - (8 * vf + 12 * v0) * T - (3 * a0 - af) * T ** 2)
+                / (2 * T ** 3),
+                (-30 * D + (14 * vf + 16 * v0) * T + (3 * a0 - 2 * af) * T ** 2)
+                / (2 * T ** 4),
+                (12 * D - 6 * (vf + v0) * T + (af - a0) * T ** 2) / (2 * T ** 5),
+            ]
+        )
+
+
+class _PerfilLimitado(_Perfil):
+    """Base dos perfis de tempo mínimo respeitando os limites de cada junta
+
+    Cada junta calcula o seu perfil de tempo mínimo T_j, e todas são
+    sincronizadas com a mais lenta por uma mudança da escala de tempo, que
+    apenas reduz as suas velocidades, acelerações e jerks. As subclasses
+    implementam _shape(tau), o deslocamento de cada junta no seu próprio tempo.
+    """
+
+    def _synchronize(self):
+        self.T = float(self.T_j.max())
+        self.ratio = self.T_j / self.T if self.T > 0 else np.zeros_like(self.T_j)
+        self.sign = np.sign(self.qf - self.q0)
+
+    def _profile(self, tau):
+        s, sd, sdd = self._shape(tau * self.ratio)
+        return (
+            self.q0 + self.sign * s,
+            self.sign * sd * self.ratio,
+            self.sign * sdd * self.ratio ** 2,
+        )
+
+
+class PerfilTrapezoidal(_PerfilLimitado):
+    """Perfil de velocidade trapezoidal de q0 até qf a partir de t0
+
+    * v_max, a_max: velocidade e aceleração máximas de cada junta
+
+    Quando a distância não permite alcançar v_max o perfil é triangular.
+    """
+
+    def __init__(self, q0, qf, v_max, a_max, t0=0.0):
+        self._setup(q0, qf, t0)
+        h = np.abs(self.qf - self.q0)
+        v_max, self.a = np.broadcast_arrays(
+            np.asarray(v_max, dtype="float"), a_max, h
+        )[:2]
+        self.h = h
+        self.v = np.minimum(v_max, np.sqrt(h * self.a))
+        self.tb = self.v / self.a
+        self.T_j = (
+            np.divide(h, self.v, out=np.zeros_like(h), where=self.v > 0) + self.tb
+        )
+        self._synchronize()
+
+    def _shape(self, tau):
+        a, v, tb, h = self.a, self.v, self.tb, self.h
+        r = self.T_j - tau
+        accelerating = tau < tb
+        cruising = tau < self.T_j - tb
+        s = np.select(
+            [accelerating, cruising],
+            [a * tau ** 2 / 2, v * (tau - tb / 2)],
+            h - a * r ** 2 / 2,
+        )
+        sd = np.select([accelerating, cruising], [a * tau, v], a * r)
+        sdd = np.select([accelerating, cruising], [a, 0.0], -a)
+        return s, sd, sdd
+
+
+class PerfilCurvaS(_PerfilLimitado):
+    """Perfil em curva S (jerk limitado) de q0 até qf a partir de t0, com
+    velocidade nula nos extremos
+
+    * v_max, a_max, j_max: velocidade, aceleração e jerk máximos de cada junta
+
+    Perfil de 7 trechos de L. Biagiotti e C. Melchiorri (Trajectory Planning for
+    Automatic Machines and Robots, 2008), com aceleração contínua. Quando a
+    distância é curta, v_max e a_max podem não ser alcançados.
+    """
+
+    def __init__(self, q0, qf, v_max, a_max, j_max, t0=0.0):
+        self._setup(q0, qf, t0)
+        h = np.abs(self.qf - self.q0)
+        v_max, a_max, j = np.broadcast_arrays(
+            np.asarray(v_max, dtype="float"), a_max, j_max, h
+        )[:3]
+        # Tempos de jerk (Tj) e de aceleração (Ta) caso v_max seja alcançada
+        reaches_a = v_max * j >= a_max ** 2
+        Tj = np.where(reaches_a, a_max / j, np.sqrt(v_max / j))
+        Ta = np.where(reaches_a, Tj + v_max / a_max, 2 * Tj)
+        Tv = np.divide(h, v_max) - Ta
+        # Caso contrário não há trecho de velocidade constante
+        short = Tv < 0
+        reaches_a = h >= 2 * a_max ** 3 / j ** 2
+        Tj_short = np.where(reaches_a, a_max / j, np.cbrt(h / (2 * j)))
+        Ta_short = np.where(
+            reaches_a,
+            Tj_short / 2 + np.sqrt((Tj_short / 2) ** 2 + h / a_max),
+            2 * Tj_short,
+        )
+        self.Tj = np.where(short, Tj_short, Tj)
+        self.Ta = np.where(short, Ta_short, Ta)
+        self.Tv = np.where(short, 0.0, Tv)
+        self.j = j
+        self.a_lim = j * self.Tj
+        self.v_lim = (self.Ta - self.Tj) * self.a_lim
+        self.h = h
+        self.T_j = 2 * self.Ta + self.Tv
+        self._synchronize()
+
+    def _accelerating(self, tau):
+        """Deslocamento, velocidade e aceleração no trecho inicial, tau em [0, Ta]"""
+        j, Tj, Ta, a, v = self.j, self.Tj, self.Ta, self.a_lim, self.v_lim
+        r = Ta - tau
+        jerk_up = tau < Tj
+        constant = tau < Ta - Tj
+        s = np.select(
+            [jerk_up, constant],
+            [j * tau ** 3 / 6, a / 6 * (3 * tau ** 2 - 3 * Tj * tau + Tj ** 2)],
+            v * Ta / 2 - v * r + j * r ** 3 / 6,
+        )
+        sd = np.select(
+            [jerk_up, constant],
+            [j * tau ** 2 / 2, a * (tau - Tj / 2)],
+            v - j * r ** 2 / 2,
+        )
+        sdd = np.select([jerk_up, constant], [j * tau, a], j * r)
+        return s, sd, sdd
+
+    def _shape(self, tau):
+        # A desaceleração é o trecho de aceleração espelhado no tempo
+        s_acc, sd_acc, sdd_acc = self._accelerating(np.minimum(tau, self.Ta))
+        s_dec, sd_dec, sdd_dec = self._accelerating(np.minimum(self.T_j - tau, self.Ta))
+        accelerating = tau < self.Ta
+        cruising = tau < self.Ta + self.Tv
+        cruise = self.v_lim * (self.Ta / 2 + tau - self.Ta)
+        s = np.select([accelerating, cruising], [s_acc, cruise], self.h - s_dec)
+        sd = np.select([accelerating, cruising], [sd_acc, self.v_lim], sd_dec)
+        sdd = np.select([accelerating, cruising], [sdd_acc, 0.0], -sdd_dec)
+        return s, sd, sdd
@@ -0,0 +1,255 @@
+"""
+Dinâmica numérica de cadeias seriais com juntas de revolução.
+
+Alternativa ao método de Lagrange simbólico: a cadeia é descrita por uma tabela
+de elos e a dinâmica é calculada numericamente a cada avaliação com álgebra de
+vetores espaciais (R. Featherstone, Rigid Body Dynamics Algorithms):
+
+* inverse_dynamics: Recursive Newton-Euler Algorithm (RNEA), torques a partir de
+    posições, velocidades e acelerações das juntas
+* forward_dynamics: Articulated-Body Algorithm (ABA), acelerações a partir dos torques
+
+Ambos são O(n) no número de elos e não exigem nenhuma derivação simbólica, de
+forma que cadeias com mais graus de liberdade são simuladas imediatamente.
+"""
+
+import numpy as np
+
+AXES = {'x': (1.0, 0.0, 0.0), 'y': (0.0, 1.0, 0.0), 'z': (0.0, 0.0, 1.0)}
+
+
+def skew(v):
+    """Matriz anti-simétrica do produto vetorial, skew(a) @ b = a x b"""
+    return np.array([[0.0, -v[2], v[1]],
+                     [v[2], 0.0, -v[0]],
+                     [-v[1], v[0], 0.0]])
+
+
+def rotation(axis, angle):
+    """Matriz de rotação (fórmula de Rodrigues) de 'angle' em torno do eixo unitário 'axis'"""
+    K = skew(axis)
+    return np.eye(3) + np.sin(angle) * K + (1 - np.cos(angle)) * K @ K
+
+
+def crm(v):
+    """Produto vetorial espacial entre vetores de movimento, crm(v) @ m = v x m"""
+    w, vo = skew(v[:3]), skew(v[3:])
+    out = np.zeros((6, 6))
+    out[:3, :3] = w
+    out[3:, :3] = vo
+    out[3:, 3:] = w
+    return out
+
+
+def crf(v):
+    """Produto vetorial espacial entre vetores de movimento e de força, crf(v) @ f = v x* f"""
+    return -crm(v).T
+
+
+def plucker(E, r):
+    """Transformada de Plücker para vetores de movimento, do referencial pai para o filho
+
+    * E: matriz de rotação que leva coordenadas do pai para o filho
+    * r: posição da origem do filho, em coordenadas do pai
+    """
+    X = np.zeros((6, 6))
+    X[:3, :3] = E
+    X[3:, 3:] = E
+    X[3:, :3] = -E @ skew(r)
+    return X
+
+
+class Elo:
+    """Elo de uma cadeia serial, conectado ao elo anterior por uma junta de revolução
+
+    * axis: eixo da junta ('x', 'y', 'z' ou vetor), expresso no referencial do elo
+        anterior, que coincide com o do elo quando o ângulo da junta é zero
+    * offset: posição da junta em relação à junta anterior, no referencial do elo anterior
+    * mass: massa do elo (kg)
+    * com: posição do centro de massa em relação à junta, no referencial do elo (m)
+    * inertia: tensor de inércia 3x3 no centro de massa, no referencial do elo, ou
+        apenas o momento de inércia em torno de z (kg.m^2)
+    """
+    def __init__(self, axis='z', offset=(0, 0, 0), mass=1.0, com=(0, 0, 0), inertia=0.0):
+        axis = np.asarray(AXES.get(axis, axis), dtype='float')
+        self.axis = axis / np.linalg.norm(axis)
+        self.offset = np.asarray(offset, dtype='float')
+        self.mass = float(mass)
+        self.com = np.asarray(com, dtype='float')
+        if np.ndim(inertia) == 0:
+            inertia = np.diag([0.0, 0.0, float(inertia)])
+        self.inertia = np.asarray(inertia, dtype='float')
+
+    def spatial_inertia(self):
+        """Inércia espacial 6x6 do elo, em relação à origem do seu referencial"""
+        C = skew(self.com)
+        I = np.zeros((6, 6))
+        I[:3, :3] = self.inertia + self.mass * C @ C.T
+        I[:3, 3:] = self.mass * C
+        I[3:, :3] = self.mass * C.T
+        I[3:, 3:] = self.mass * np.eye(3)
+        return I
+
+
+class CadeiaSerial:
+    """Cadeia serial de elos com juntas de revolução
+
+    * elos: lista de Elo, da base até a ponta
+    * gravity: vetor aceleração da gravidade no referencial inercial (m/s^2)
+    * input_matrix: matriz B que converte os torques de entrada nos torques das
+        juntas, tau_juntas = B tau. None utiliza a identidade, com os torques
+        aplicados diretamente nas juntas
+
+    O método f_ode(t, y) pode ser passado diretamente aos solvers de EDO do Scipy,
+    com y = [thetas, omegas] e os torques de entrada definidos em self.torque.
+    """
+    def __init__(self, elos, gravity=(0, -9.8, 0), input_matrix=None):
+        self.elos = list(elos)
+        self.n = len(self.elos)
+        self.gravity = np.asarray(gravity, dtype='float')
+        self.torque = np.zeros(self.n)
+        self.input_matrix = None if input_matrix is None else np.asarray(input_matrix, dtype='float')
+        # Termos constantes de cada elo calculados apenas uma vez
+        self._S = [np.concatenate([e.axis, np.zeros(3)]) for e in self.elos]
+        self._I = [e.spatial_inertia() for e in self.elos]
+        self._a0 = np.concatenate([np.zeros(3), -self.gravity])
+
+    def _transforms(self, q):
+        """Transformadas de Plücker de cada elo em relação ao anterior"""
+        # A rotação do referencial é a transposta da rotação dos vetores
+        return [plucker(rotation(e.axis, qi).T, e.offset) for e, qi in zip(self.elos, q)]
+
+    def inverse_dynamics(self, q, qd, qdd):
+        """Torques das juntas necessários para as acelerações qdd (RNEA)"""
+        X = self._transforms(q)
+        v = np.zeros(6)
+        a = self._a0
+        forces = []
+        for i in range(self.n):
+            S = self._S[i]
+            vJ = S * qd[i]
+            v = X[i] @ v + vJ
+            a = X[i] @ a + S * qdd[i] + crm(v) @ vJ
+            forces.append(self._I[i] @ a + crf(v) @ self._I[i] @ v)
+
+        tau = np.empty(self.n)
+        for i in reversed(range(self.n)):
+            tau[i] = self._S[i] @ forces[i]
+            if i > 0:
+                forces[i - 1] = forces[i - 1] + X[i].T @ forces[i]
+        return tau
+
+    def forward_dynamics(self, q, qd, tau):
+        """Acelerações das juntas resultantes dos torques tau (ABA)"""
+        X = self._transforms(q)
+        n = self.n
+        v = [None] * n
+        c = [None] * n
+        IA = [None] * n
+        pA = [None] * n
+        # Velocidades e termos de velocidade de cada elo, da base para a ponta
+        v_parent = np.zeros(6)
+        for i in range(n):
+            vJ = self._S[i] * qd[i]
+            v[i] = X[i] @ v_parent + vJ
+            c[i] = crm(v[i]) @ vJ
+            IA[i] = self._I[i].copy()
+            pA[i] = crf(v[i]) @ self._I[i] @ v[i]
+            v_parent = v[i]
+
+        # Inércias articuladas, da ponta para a base
+        U = [None] * n
+        d = np.empty(n)
+        u = np.empty(n)
+        for i in reversed(range(n)):
+            S = self._S[i]
+            U[i] = IA[i] @ S
+            d[i] = S @ U[i]
+            u[i] = tau[i] - S @ pA[i]
+            if i > 0:
+                Ia = IA[i] - np.outer(U[i], U[i]) / d[i]
+                pa = pA[i] + Ia @ c[i] + U[i] * u[i] / d[i]
+                IA[i - 1] += X[i].T @ Ia @ X[i]
+                pA[i - 1] += X[i].T @ pa
+
+        # Acelerações, da base para a ponta
+        qdd = np.empty(n)
+        a_parent = self._a0
+        for i in range(n):
+            a = X[i] @ a_parent + c[i]
+            qdd[i] = (u[i] - U[i] @ a) / d[i]
+            a_parent = a + self._S[i] * qdd[i]
+        return qdd
+
+    def mass_matrix(self, q):
+        """Matriz de massa M(q), obtida com n avaliações do RNEA sem gravidade"""
+        zeros = np.zeros(self.n)
+        a0, self._a0 = self._a0, np.zeros(6)
+        try:
+            return np.column_stack([self.inverse_dynamics(q, zeros, e) for e in np.eye(self.n)])
+        finally:
+            self._a0 = a0
+
+    def joint_torques(self, torque):
+        """Torques das juntas resultantes dos torques de entrada, B tau"""
+        if self.input_matrix is None:
+            return np.asarray(torque, dtype='float')
+        return self.input_matrix @ torque
+
+    # Função utilizada pelo solver da EDO
+    def f_ode(self, t, y):
+        q, qd = y[:self.n], y[self.n:]
+        return np.concatenate([qd, self.forward_dynamics(q, qd, self.joint_torques(self.torque))])
+
+
+def scara(L1=1.0, R1=0.5, R2=0.4, I1=0.333, I2=0.25, M1=1.0, M2=0.8, G=9.8):
+    """Cadeia do SCARA com os mesmos parâmetros e convenções de Manipulador2GdL,
+    cujo modelo de Lagrange adota a gravidade no sentido +y do referencial B0
+
+    No modelo de Lagrange tau_2 é um torque aplicado no referencial B2, sem reação
+    em B1, e contribui também com a equação de theta_1. Os torques de entrada são
+    convertidos nos torques das juntas pela mesma matriz B = [[1, 1], [0, 1]], de
+    forma que self.torque tem o mesmo significado nos dois modelos.
+    """
+    return CadeiaSerial([
+        Elo('z', (0, 0, 0), M1, (R1, 0, 0), I1),
+        Elo('z', (L1, 0, 0), M2, (R2, 0, 0), I2),
+    ], gravity=(0, G, 0), input_matrix=[[1.0, 1.0], [0.0, 1.0]])
+
+
+def antropomorfico(L1=1.0, L2=0.8, M1=0.0, M2=1.0, M3=0.8, I1=0.01, G=9.8):
+    """Braço antropomórfico de 3 GdL do script de cinemática: theta_1 em torno de
+    B0.y, theta_2 em torno de B1.z e theta_3 em torno de B2.z, com elos de
+    comprimento L1 e L2 modelados como barras uniformes e gravidade em -y"""
+    return CadeiaSerial([
+        Elo('y', (0, 0, 0), M1, (0, 0, 0), np.diag([I1, I1, I1])),
+        Elo('z', (0, 0, 0), M2, (L1 / 2, 0, 0), np.diag([0.0, 1, 1]) * M2 * L1 ** 2 / 12),
+        Elo('z', (L1, 0, 0), M3, (L2 / 2, 0, 0), np.diag([0.0, 1, 1]) * M3 * L2 ** 2 / 12),
+    ], gravity=(0, -G, 0))
+
+
+if __name__ == "__main__":
+    # Simulação do braço antropomórfico a partir do repouso, sem derivação simbólica
+    from scipy.integrate import solve_ivp
+    braco = antropomorfico()
+    solution = solve_ivp(braco.f_ode, (0, 5), [0, np.deg2rad(30), 0, 0, 0, 0],
+                         t_eval=np.arange(0, 5, 1. / 60))
+    print("Estado final [thetas, omegas]:", solution.y[:, -1])
+
+    # Comparação do SCARA com o modelo de Lagrange de Manipulador2GdL, com tau_2
+    # não nulo, que também atua na equação de theta_1
+    import importlib.util
+    import os
+    import sys
+    simulation_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'Simulation')
+    sys.path.append(simulation_dir)
+    spec = importlib.util.spec_from_file_location(
+        'scara_lagrange', os.path.join(simulation_dir, 'scriptSimulation_2Dof-Scara.py'))
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    lagrange, scara_rnea = script.Manipulador2GdL(), scara()
+    y = np.array([0.3, 0.5, -0.2, 0.4])
+    lagrange.torque = [0.0, 1.0]
+    scara_rnea.torque = np.array([0.0, 1.0])
+    error = np.abs(np.asarray(lagrange.f_ode(0, y), dtype='float') - scara_rnea.f_ode(0, y)).max()
+    print("Diferença entre o RNEA e o modelo de Lagrange do SCARA:", error)
@@ -0,0 +1,241 @@
+"""
+Cinemática inversa do SCARA e do braço antropomórfico em lotes de pontos.
+
+Todas as funções recebem arrays de pontos no formato (..., 3) e operam sobre o
+lote inteiro com o NumPy, de forma que trajetórias cartesianas com milhões de
+pontos são convertidas para o espaço das juntas sem laços em Python.
+
+* scara_ik() e antropomorfico_ik(): soluções analíticas, com a escolha do
+    cotovelo para cima ou para baixo
+* damped_least_squares(): solução numérica por mínimos quadrados amortecidos
+    (Levenberg-Marquardt) para qualquer cadeia com cinemática direta e
+    Jacobiano vetorizados, robusta perto das singularidades e que converge para
+    o ponto mais próximo quando o alvo está fora do espaço de trabalho
+* antropomorfico_dls(): o método numérico aplicado ao braço antropomórfico
+
+Os eixos e ângulos seguem os scripts de cinemática e o módulo kinematics.py:
+o SCARA gira em torno de B0.z, e o braço antropomórfico gira theta_1 em torno
+de B0.y e theta_2, theta_3 em torno do eixo z dos referenciais móveis.
+"""
+
+import numpy as np
+
+ELBOWS = ('up', 'down')
+
+
+def _wrap(angle):
+    """Ângulos no intervalo [-pi, pi)"""
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def _planar_ik(x, y, l_1, l_2, elbow):
+    """Ângulos do elo plano de 2 juntas que alcança (x, y) e se o ponto é alcançável"""
+    if elbow not in ELBOWS:
+        raise ValueError('Cotovelo deve ser um de %s' % (ELBOWS,))
+    c_2 = (x ** 2 + y ** 2 - l_1 ** 2 - l_2 ** 2) / (2 * l_1 * l_2)
+    reachable = np.abs(c_2) <= 1
+    # Fora do espaço de trabalho o braço é esticado (ou dobrado) na direção do ponto
+    theta_2 = np.arccos(np.clip(c_2, -1, 1))
+    if elbow == 'up':
+        theta_2 = -theta_2
+    theta_1 = np.arctan2(y, x) - np.arctan2(l_2 * np.sin(theta_2), l_1 + l_2 * np.cos(theta_2))
+    return _wrap(theta_1), theta_2, reachable
+
+
+def scara_fk(q, l_1=1.0, l_2=0.8):
+    """Posição da ponta do SCARA, q no formato (..., 2), retorna (..., 3)"""
+    q = np.asarray(q, dtype='float')
+    theta_1, theta_12 = q[..., 0], q[..., 0] + q[..., 1]
+    x = l_1 * np.cos(theta_1) + l_2 * np.cos(theta_12)
+    y = l_1 * np.sin(theta_1) + l_2 * np.sin(theta_12)
+    return np.moveaxis(np.array([x, y, np.zeros_like(x)]), 0, -1)
+
+
+def scara_ik(points, l_1=1.0, l_2=0.8, elbow='up'):
+    """Ângulos (theta_1, theta_2) do SCARA que levam a ponta aos pontos
+
+    * points: pontos no formato (..., 2) ou (..., 3), a coordenada z é ignorada
+    * elbow: 'up', cotovelo à esquerda do segmento da base até a ponta
+        (theta_2 <= 0), ou 'down' (theta_2 >= 0)
+
+    Retorna (q, reachable), q no formato (..., 2) e reachable indicando os pontos
+    dentro do espaço de trabalho. Para os demais, q aponta o braço na direção do
+    ponto, esticado ou dobrado.
+    """
+    points = np.asarray(points, dtype='float')
+    theta_1, theta_2, reachable = _planar_ik(points[..., 0], points[..., 1], l_1, l_2, elbow)
+    return np.stack([theta_1, theta_2], axis=-1), reachable
+
+
+def antropomorfico_fk(q, l_1=1.0, l_2=0.8):
+    """Posição da ponta do braço antropomórfico, q no formato (..., 3), retorna (..., 3)"""
+    q = np.asarray(q, dtype='float')
+    theta_1, theta_2, theta_23 = q[..., 0], q[..., 1], q[..., 1] + q[..., 2]
+    # Distância r ao eixo da base e altura s da ponta no plano do braço
+    r = l_1 * np.cos(theta_2) + l_2 * np.cos(theta_23)
+    s = l_1 * np.sin(theta_2) + l_2 * np.sin(theta_23)
+    return np.moveaxis(np.array([r * np.cos(theta_1), s, -r * np.sin(theta_1)]), 0, -1)
+
+
+def antropomorfico_jacobian(q, l_1=1.0, l_2=0.8):
+    """Jacobiano da posição da ponta do braço antropomórfico, formato (..., 3, 3)"""
+    q = np.asarray(q, dtype='float')
+    theta_1, theta_2, theta_23 = q[..., 0], q[..., 1], q[..., 1] + q[..., 2]
+    c_1, s_1 = np.cos(theta_1), np.sin(theta_1)
+    c_23, s_23 = l_2 * np.cos(theta_23), l_2 * np.sin(theta_23)
+    r = l_1 * np.cos(theta_2) + c_23
+    s = l_1 * np.sin(theta_2) + s_23
+    J = np.array([
+        [-r * s_1, -s * c_1, -s_23 * c_1],
+        [np.zeros_like(r), r, c_23],
+        [-r * c_1, s * s_1, s_23 * s_1],
+    ])
+    # Componentes no início da memória, ver damped_least_squares()
+    return np.moveaxis(J, (0, 1), (-2, -1))
+
+
+def antropomorfico_ik(points, l_1=1.0, l_2=0.8, elbow='up', shoulder='front'):
+    """Ângulos (theta_1, theta_2, theta_3) do braço antropomórfico que levam a
+    ponta aos pontos (..., 3)
+
+    theta_1 gira o plano do braço até o ponto, e theta_2, theta_3 são a solução
+    do elo plano de 2 juntas nesse plano.
+
+    * elbow: 'up' ou 'down', como em scara_ik()
+    * shoulder: 'front', com o braço voltado para o ponto, ou 'back', com a
+        base girada de pi e o braço inclinado para trás
+
+    Retorna (q, reachable), como scara_ik(). Sobre o eixo y (x = z = 0) theta_1 é
+    arbitrário e vale 0.
+    """
+    points = np.asarray(points, dtype='float')
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    theta_1 = np.arctan2(-z, x)
+    r = np.hypot(x, z)
+    if shoulder == 'back':
+        theta_1, r = _wrap(theta_1 + np.pi), -r
+    elif shoulder != 'front':
+        raise ValueError("Ombro deve ser 'front' ou 'back'")
+    theta_2, theta_3, reachable = _planar_ik(r, y, l_1, l_2, elbow)
+    return np.stack([theta_1, theta_2, theta_3], axis=-1), reachable
+
+
+def _components(array, n_axes):
+    """View com os últimos n_axes eixos (componentes) movidos para o início"""
+    return np.moveaxis(array, range(-n_axes, 0), range(n_axes))
+
+
+def _cholesky_solve(A, b):
+    """Resolve A x = b para um lote de matrizes simétricas positivas definidas
+    pequenas, com A[i][j] e b[i] arrays (M,) de cada elemento
+
+    As operações são feitas elemento a elemento sobre os arrays de cada
+    componente, o que para matrizes 2x2 ou 3x3 é várias vezes mais rápido que o
+    np.linalg.solve em lote, cujo custo é dominado pela chamada por matriz.
+    """
+    m = len(b)
+    L = [[None] * m for _ in range(m)]
+    for j in range(m):
+        L[j][j] = np.sqrt(A[j][j] - sum(L[j][k] ** 2 for k in range(j)))
+        for i in range(j + 1, m):
+            L[i][j] = (A[i][j] - sum(L[i][k] * L[j][k] for k in range(j))) / L[j][j]
+    y = [None] * m
+    for i in range(m):
+        y[i] = (b[i] - sum(L[i][k] * y[k] for k in range(i))) / L[i][i]
+    x = [None] * m
+    for i in reversed(range(m)):
+        x[i] = (y[i] - sum(L[k][i] * x[k] for k in range(i + 1, m))) / L[i][i]
+    return x
+
+
+def _dls_block(forward, jacobian, targets, q, damping, tol, max_iter):
+    """Mínimos quadrados amortecidos de um bloco, targets (m, M) e q (n, M)
+    com os componentes no primeiro eixo. Atualiza q e retorna o erro (M,)"""
+    m, n = len(targets), len(q)
+    e = targets - _components(forward(q.T), 1)
+    error = np.sqrt(np.sum(e ** 2, axis=0))
+    lambda_2 = np.full(len(error), damping ** 2)
+    active = np.flatnonzero(error > tol)
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        q_active, e_active = q[:, active], e[:, active]
+        lambda_active, error_active = lambda_2[active], error[active]
+        J = _components(jacobian(q_active.T), 2)
+        # dq = J^T (J J^T + lambda^2 I)^-1 e
+        A = [[None] * m for _ in range(m)]
+        for i in range(m):
+            for j in range(i + 1):
+                A[i][j] = A[j][i] = sum(J[i, k] * J[j, k] for k in range(n))
+            A[i][i] = A[i][i] + lambda_active
+        y = _cholesky_solve(A, e_active)
+        q_new = q_active + np.array([sum(J[i, k] * y[i] for i in range(m)) for k in range(n)])
+        e_new = targets[:, active] - _components(forward(q_new.T), 1)
+        error_new = np.sqrt(np.sum(e_new ** 2, axis=0))
+
+        better = error_new < error_active
+        accepted = active[better]
+        q[:, accepted], e[:, accepted] = q_new[:, better], e_new[:, better]
+        error_active = np.where(better, error_new, error_active)
+        lambda_active = np.where(better, np.maximum(lambda_active / 4, damping ** 2),
+                                 lambda_active * 16)
+        error[active], lambda_2[active] = error_active, lambda_active
+        # Para os pontos convergidos e os que não progridem mesmo com passos mínimos
+        active = active[(error_active > tol) & (lambda_active < 1e12)]
+    return error
+
+
+def damped_least_squares(forward, jacobian, targets, q0, damping=1e-2, tol=1e-10,
+                         max_iter=100, block=16384):
+    """Cinemática inversa numérica por mínimos quadrados amortecidos em lote
+
+    A cada iteração, para todos os pontos ainda não convergidos ao mesmo tempo,
+    dq = J^T (J J^T + lambda^2 I)^-1 e, com e = alvo - forward(q). O passo só é
+    aceito se reduz o erro do ponto, e o amortecimento lambda de cada ponto é
+    reduzido (até 'damping') quando o passo é aceito e aumentado quando não, de
+    forma que o método se aproxima do Gauss-Newton longe das singularidades e do
+    gradiente perto delas.
+
+    * forward: função q (M, n) -> posições (M, m)
+    * jacobian: função q (M, n) -> Jacobiano (M, m, n)
+    * targets: pontos alvo no formato (..., m)
+    * q0: estimativa inicial, no formato (..., n) ou (n,) para todos os pontos
+    * damping: amortecimento mínimo, evita passos grandes nas singularidades
+    * tol: erro de posição (norma) para a convergência
+    * block: pontos resolvidos por vez, de forma que os arrays intermediários
+        caibam no cache do processador
+
+    Internamente os arrays são armazenados com os componentes no primeiro eixo,
+    forward e jacobian recebem views de q no formato (M, n) cujas colunas
+    q[:, i] são contíguas, e são mais rápidas se também retornarem views
+    transpostas de arrays com os componentes no primeiro eixo.
+
+    Retorna (q, error), q no formato (..., n) e a norma do erro final de cada
+    ponto no formato (...). Pontos fora do espaço de trabalho terminam no ponto
+    alcançável mais próximo que o método encontra.
+    """
+    targets = np.asarray(targets, dtype='float')
+    shape, m = targets.shape[:-1], targets.shape[-1]
+    targets = np.ascontiguousarray(targets.reshape(-1, m).T)
+    q0 = np.asarray(q0, dtype='float')
+    n = q0.shape[-1]
+    q = np.array(np.broadcast_to(q0, shape + (n,)).reshape(-1, n).T, order='C')
+
+    error = np.empty(targets.shape[1])
+    for start in range(0, len(error), block):
+        chunk = slice(start, start + block)
+        error[chunk] = _dls_block(forward, jacobian, targets[:, chunk], q[:, chunk],
+                                  damping, tol, max_iter)
+    return q.T.reshape(shape + (n,)), error.reshape(shape)
+
+
+def antropomorfico_dls(points, q0=(0.0, 0.5, -1.0), l_1=1.0, l_2=0.8, **options):
+    """Cinemática inversa numérica do braço antropomórfico, ver damped_least_squares()
+
+    q0 pode ser uma única configuração inicial ou uma por ponto, por exemplo a
+    solução do ponto anterior de uma trajetória.
+    """
+    return damped_least_squares(
+        lambda q: antropomorfico_fk(q, l_1, l_2),
+        lambda q: antropomorfico_jacobian(q, l_1, l_2),
+        points, q0, **options)
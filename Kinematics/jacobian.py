@@ -0,0 +1,137 @@
+"""
+Manipulabilidade e número de condição do Jacobiano dos manipuladores.
+
+O Jacobiano da ponta é o de CadeiaCinematica.jacobian(), lambdificado a partir
+da velocidade da ponta, ou qualquer função vetorizada q (..., n) -> (..., m, n),
+como antropomorfico_jacobian() de inverse_kinematics.py. A partir dos valores
+singulares de J são calculadas:
+
+* a manipulabilidade de Yoshikawa, w = sqrt(det(J^T J)), o produto dos valores
+    singulares, nula nas singularidades
+* o número de condição, a razão entre o maior e o menor valor singular, que
+    tende ao infinito nas singularidades
+
+workspace_map() avalia as medidas em todas as configurações de um
+EspacoDeTrabalho, e singular_segments() procura os trechos de uma trajetória
+próximos de singularidades antes de enviá-la ao controlador.
+
+    cadeia = kinematics.antropomorfico()
+    segments, values = singular_segments(cadeia.jacobian, q, max_condition=50)
+"""
+
+import numpy as np
+
+
+def _gram(J):
+    """Matriz de Gram de J (..., m, n), J^T J ou J J^T, a de menor dimensão, como
+    uma lista de listas com os arrays (...) de cada elemento"""
+    J = np.moveaxis(np.asarray(J, dtype='float'), (-2, -1), (0, 1))
+    if J.shape[0] < J.shape[1]:
+        J = np.swapaxes(J, 0, 1)
+    k = J.shape[1]
+    G = [[None] * k for _ in range(k)]
+    for i in range(k):
+        for j in range(i + 1):
+            G[i][j] = G[j][i] = np.einsum('l...,l...->...', J[:, i], J[:, j])
+    return G
+
+
+def _eigenvalues(G):
+    """Autovalores da matriz simétrica G em ordem crescente, no formato (..., k)
+
+    Para matrizes 2x2 e 3x3 as fórmulas fechadas são avaliadas elemento a
+    elemento, várias vezes mais rápidas que o np.linalg.eigvalsh em lote.
+    """
+    k = len(G)
+    if k == 1:
+        return G[0][0][..., None]
+    # Nas fórmulas fechadas o menor autovalor é obtido do determinante, que é
+    # preciso, em vez da diferença entre termos próximos perto das singularidades
+    if k == 2:
+        mean = (G[0][0] + G[1][1]) / 2
+        radius = np.hypot((G[0][0] - G[1][1]) / 2, G[0][1])
+        largest = mean + radius
+        det = G[0][0] * G[1][1] - G[0][1] ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            smallest = np.where(largest > 0, det / largest, 0.0)
+        return np.stack([smallest, largest], axis=-1)
+    if k == 3:
+        # Método trigonométrico para matrizes simétricas 3x3
+        mean = (G[0][0] + G[1][1] + G[2][2]) / 3
+        off = G[0][1] ** 2 + G[0][2] ** 2 + G[1][2] ** 2
+        d = [G[i][i] - mean for i in range(3)]
+        p = np.sqrt((d[0] ** 2 + d[1] ** 2 + d[2] ** 2 + 2 * off) / 6)
+        det_d = (d[0] * (d[1] * d[2] - G[1][2] ** 2)
+                 - G[0][1] * (G[0][1] * d[2] - G[1][2] * G[0][2])
+                 + G[0][2] * (G[0][1] * G[1][2] - d[1] * G[0][2]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.where(p > 0, det_d / (2 * p ** 3), 0.0)
+        phi = np.arccos(np.clip(r, -1, 1)) / 3
+        largest = mean + 2 * p * np.cos(phi)
+        middle = mean + 2 * p * np.cos(phi - 2 * np.pi / 3)
+        det = (G[0][0] * (G[1][1] * G[2][2] - G[1][2] ** 2)
+               - G[0][1] * (G[0][1] * G[2][2] - G[1][2] * G[0][2])
+               + G[0][2] * (G[0][1] * G[1][2] - G[1][1] * G[0][2]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            smallest = np.where(middle > 0, det / (largest * middle), 0.0)
+        return np.stack([smallest, middle, largest], axis=-1)
+    return np.linalg.eigvalsh(np.moveaxis(np.array(G), (0, 1), (-2, -1)))
+
+
+def singular_values(J):
+    """Valores singulares de J (..., m, n) em ordem crescente, (..., min(m, n))"""
+    return np.sqrt(np.clip(_eigenvalues(_gram(J)), 0, None))
+
+
+def manipulability(J):
+    """Manipulabilidade de Yoshikawa, w = sqrt(det(J^T J)), no formato (...)"""
+    return np.prod(singular_values(J), axis=-1)
+
+
+def condition_number(J):
+    """Número de condição de J, infinito nas singularidades, no formato (...)"""
+    sigma = singular_values(J)
+    with np.errstate(divide='ignore'):
+        return sigma[..., -1] / sigma[..., 0]
+
+
+def measures(jacobian, q):
+    """Manipulabilidade e número de condição nas configurações q (..., n)
+
+    Retorna um dicionário {'manipulability': w, 'condition': c} de arrays (...),
+    calculados a partir de uma única decomposição do Jacobiano.
+    """
+    sigma = singular_values(jacobian(q))
+    with np.errstate(divide='ignore'):
+        condition = sigma[..., -1] / sigma[..., 0]
+    return {'manipulability': np.prod(sigma, axis=-1), 'condition': condition}
+
+
+def workspace_map(jacobian, espaco):
+    """Medidas em todas as configurações de um EspacoDeTrabalho
+
+    Retorna (points, values), os pontos (P, 3) do espaço de trabalho e o
+    dicionário de measures() de cada um, por exemplo para um gráfico de
+    dispersão colorido pela manipulabilidade.
+    """
+    return espaco.points, measures(jacobian, espaco.configurations)
+
+
+def singular_segments(jacobian, q, max_condition=100.0, min_manipulability=None):
+    """Trechos da trajetória q (T, n) próximos de singularidades
+
+    Um instante é próximo de uma singularidade se o número de condição passa de
+    max_condition ou, caso informado, a manipulabilidade é menor que
+    min_manipulability.
+
+    Retorna (segments, values): segments é um array (K, 2) com os índices
+    [início, fim) de cada trecho, e values as medidas de cada instante, ver
+    measures().
+    """
+    values = measures(jacobian, q)
+    near = values['condition'] > max_condition
+    if min_manipulability is not None:
+        near |= values['manipulability'] < min_manipulability
+    # Bordas dos trechos, onde a máscara muda de valor
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], near.view(np.int8), [0]])))
+    return edges.reshape(-1, 2), values
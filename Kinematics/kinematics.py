@@ -0,0 +1,164 @@
+"""
+Cinemática direta de cadeias seriais com N juntas de revolução.
+
+Generaliza os scripts do SCARA e do braço antropomórfico: a cadeia é descrita
+por uma tabela de eixos (ou de Denavit-Hartenberg), as posições, velocidades e
+acelerações de todos os pontos são derivadas uma única vez com o Sympy e
+lambdificadas em funções do NumPy, avaliadas em arrays de trajetórias inteiras.
+O Jacobiano da ponta é obtido da expressão da sua velocidade, v = J qd.
+"""
+
+import numpy as np
+from sympy import Dummy, lambdify, sympify
+from sympy.physics.mechanics import dynamicsymbols, msubs
+from sympy.physics.vector import ReferenceFrame, Vector, time_derivative
+
+
+class CadeiaCinematica:
+    """Cadeia serial de elos conectados por juntas de revolução
+
+    * table: lista de linhas (axis, link), uma por junta, da base até a ponta:
+        - axis: eixo ('x', 'y' ou 'z') do referencial anterior em torno do qual
+            a junta gira
+        - link: vetor (x, y, z) do elo, do ponto da junta até o próximo ponto,
+            expresso no referencial da junta
+    Os comprimentos podem ser símbolos do Sympy para a análise das expressões
+    simbólicas (self.r, self.v e self.a), mas devem ser números para a avaliação.
+
+    Os pontos da cadeia são a origem e a extremidade de cada elo, de forma que
+    as funções de avaliação retornam arrays no formato (T, N + 1, 3). O Jacobiano
+    da ponta (self.J) tem o formato (T, 3, N).
+    """
+    def __init__(self, table):
+        self.table = [(axis, tuple(sympify(c) for c in link)) for axis, link in table]
+        self.n = len(self.table)
+        self.q = dynamicsymbols('theta_1:%d' % (self.n + 1))
+        self.frames = self._frames_axis()
+        self._derive()
+
+    @classmethod
+    def from_dh(cls, rows):
+        """Cadeia a partir dos parâmetros de Denavit-Hartenberg (a, alpha, d, offset)
+        de cada junta, com o ângulo da junta em torno de z somado ao offset"""
+        chain = cls.__new__(cls)
+        chain.table = [tuple(sympify(v) for v in row) for row in rows]
+        chain.n = len(chain.table)
+        chain.q = dynamicsymbols('theta_1:%d' % (chain.n + 1))
+        chain.frames = chain._frames_dh()
+        chain._derive()
+        return chain
+
+    def _frames_axis(self):
+        """Referenciais e vetores dos elos a partir da tabela de eixos"""
+        frames = [ReferenceFrame('B0')]
+        links = []
+        for i, (axis, link) in enumerate(self.table):
+            parent = frames[-1]
+            frame = parent.orientnew('B%d' % (i + 1), 'Axis', [self.q[i], getattr(parent, axis)])
+            frames.append(frame)
+            links.append(link[0] * frame.x + link[1] * frame.y + link[2] * frame.z)
+        self.links = links
+        return frames
+
+    def _frames_dh(self):
+        """Referenciais e vetores dos elos a partir da tabela de Denavit-Hartenberg"""
+        frames = [ReferenceFrame('B0')]
+        links = []
+        for i, (a, alpha, d, offset) in enumerate(self.table):
+            parent = frames[-1]
+            # Rotação da junta em torno de z e torção do elo em torno do novo x
+            joint = parent.orientnew('J%d' % (i + 1), 'Axis', [self.q[i] + offset, parent.z])
+            frame = joint.orientnew('B%d' % (i + 1), 'Axis', [alpha, joint.x])
+            frames.append(frame)
+            links.append(d * parent.z + a * joint.x)
+        self.links = links
+        return frames
+
+    def _derive(self):
+        """Deriva as expressões de posição, velocidade e aceleração de cada ponto"""
+        B0 = self.frames[0]
+        r = Vector(0)
+        self.r, self.v, self.a = [], [], []
+        for link in [Vector(0)] + self.links:
+            r = r + link
+            v = time_derivative(r, B0)
+            self.r.append(r.to_matrix(B0))
+            self.v.append(v.to_matrix(B0))
+            self.a.append(time_derivative(v, B0).to_matrix(B0))
+        # Jacobiano da ponta, derivada da sua velocidade em relação a cada qd
+        t = dynamicsymbols._t
+        self.J = self.v[-1].jacobian([qi.diff(t) for qi in self.q])
+        self._compiled = None
+
+    def _compile(self):
+        """Lambdifica as expressões, substituindo as funções do tempo por símbolos"""
+        t = dynamicsymbols._t
+        q = [Dummy() for _ in self.q]
+        qd = [Dummy() for _ in self.q]
+        qdd = [Dummy() for _ in self.q]
+        subs = {}
+        for i, qi in enumerate(self.q):
+            subs[qi.diff(t, 2)] = qdd[i]
+            subs[qi.diff(t)] = qd[i]
+            subs[qi] = q[i]
+
+        def compile_points(points, args):
+            exprs = [msubs(e, subs) for p in points for e in p]
+            return lambdify(args, exprs, modules='numpy', cse=True)
+
+        self._compiled = (
+            compile_points(self.r, q),
+            compile_points(self.v, q + qd),
+            compile_points(self.a, q + qd + qdd),
+            compile_points([self.J], q),
+        )
+
+    def _evaluate(self, index, *args):
+        if self._compiled is None:
+            self._compile()
+        columns = [np.asarray(arg, dtype='float') for arg in args]
+        shape = np.broadcast_shapes(*[c.shape[:-1] for c in columns])
+        values = self._compiled[index](*[c[..., i] for c in columns for i in range(self.n)])
+        # Termos constantes (como a origem) são expandidos para o formato das trajetórias
+        values = np.stack([np.broadcast_to(v, shape) for v in values], axis=-1)
+        return values.reshape(shape + (self.n + 1, 3))
+
+    def jacobian(self, q):
+        """Jacobiano da ponta, q no formato (..., N), retorna (..., 3, N)
+
+        O array retornado é uma view de um array com os elementos do Jacobiano
+        no primeiro eixo, o formato mais rápido para damped_least_squares().
+        """
+        if self._compiled is None:
+            self._compile()
+        q = np.asarray(q, dtype='float')
+        shape = q.shape[:-1]
+        values = self._compiled[3](*[q[..., i] for i in range(self.n)])
+        values = np.array([np.broadcast_to(v, shape) for v in values])
+        return np.moveaxis(values.reshape((3, self.n) + shape), (0, 1), (-2, -1))
+
+    def positions(self, q):
+        """Posições de todos os pontos, q no formato (..., N)"""
+        return self._evaluate(0, q)
+
+    def velocities(self, q, qd):
+        """Velocidades de todos os pontos, q e qd no formato (..., N)"""
+        return self._evaluate(1, q, qd)
+
+    def accelerations(self, q, qd, qdd):
+        """Acelerações de todos os pontos, q, qd e qdd no formato (..., N)"""
+        return self._evaluate(2, q, qd, qdd)
+
+    def forward(self, q, qd, qdd):
+        """Posições, velocidades e acelerações de todos os pontos"""
+        return self.positions(q), self.velocities(q, qd), self.accelerations(q, qd, qdd)
+
+
+def scara(l_1=1.0, l_2=0.8):
+    """Cadeia do SCARA do script de cinemática"""
+    return CadeiaCinematica([('z', (l_1, 0, 0)), ('z', (l_2, 0, 0))])
+
+
+def antropomorfico(l_1=1.0, l_2=0.8):
+    """Cadeia do braço antropomórfico do script de cinemática"""
+    return CadeiaCinematica([('y', (0, 0, 0)), ('z', (l_1, 0, 0)), ('z', (l_2, 0, 0))])
@@ -1,9 +1,12 @@
 
 # Funções das Bibliotecas Utilizadas
-from sympy import symbols, trigsimp, latex, pprint
+from sympy import symbols, latex, pprint
 from sympy.physics.mechanics import dynamicsymbols
 from sympy.physics.vector import ReferenceFrame, Vector
-from sympy.physics.vector import time_derivative
+from symbolic import Derivacao
+
+# Etapas da derivação, com os tempos e os resultados intermediários memorizados
+derivacao = Derivacao('Cinemática do SCARA')
 
 # Variáveis Simbólicas
 theta_1, theta_2 = dynamicsymbols('theta_1 theta_2')
@@ -21,31 +24,15 @@ B0_r_OA = Vector(0)      # Vetor Nulo
 B1_r_AB = l_1 * B1.x     # Vetor que liga os pontos A e B expresso no referencial móvel B1
 B2_r_BC = l_2 * B2.x     # Vetor que liga os pontos B e C expresso no referencial móvel B2
 
-# Cinemática do ponto A em relação ao referencial B0
-r_A = B0_r_OA
-v_A = time_derivative(r_A, B0)
-a_A = time_derivative(v_A, B0)
-
-# Cinemática do ponto B em relação ao referencial B0
-r_B  = r_A + B1_r_AB.express(B0)
-v_B = time_derivative(r_B, B0)
-a_B = time_derivative(v_B, B0)
-
-# Cinemática do ponto C em relação ao referencial B0
-r_C  = r_B.express(B0) + B2_r_BC.express(B0)
-v_C = (time_derivative(r_C, B0))
-a_C = (time_derivative(v_C, B0))
-
-# Simplificação dos Resultados
-r_A = (r_A.to_matrix(B0)).applyfunc(trigsimp)
-v_A = (v_A.to_matrix(B0)).applyfunc(trigsimp)
-a_A = (a_A.to_matrix(B0)).applyfunc(trigsimp)
-r_B = (r_B.to_matrix(B0)).applyfunc(trigsimp)
-v_B = (v_B.to_matrix(B0)).applyfunc(trigsimp)
-a_B = (a_B.to_matrix(B0)).applyfunc(trigsimp)
-r_C = (r_C.to_matrix(B0)).applyfunc(trigsimp)
-v_C = (v_C.to_matrix(B0)).applyfunc(trigsimp)
-a_C = (a_C.to_matrix(B0)).applyfunc(trigsimp)
+# Cinemática dos pontos em relação ao referencial B0, cada ponto reutiliza a
+# cinemática do anterior e as rotações memorizadas de cada referencial
+with derivacao.stage('Cinemática do ponto A'):
+    r_A, v_A, a_A = derivacao.point('A', B0, None, B0_r_OA)
+with derivacao.stage('Cinemática do ponto B'):
+    r_B, v_B, a_B = derivacao.point('B', B0, 'A', B1_r_AB)
+with derivacao.stage('Cinemática do ponto C'):
+    r_C, v_C, a_C = derivacao.point('C', B0, 'B', B2_r_BC)
+derivacao.report()
 
 # Resultados de C
 pprint(r_C)
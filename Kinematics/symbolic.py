@@ -0,0 +1,277 @@
+"""
+Derivação simbólica com simplificação direcionada e resultados memorizados.
+
+trigsimp() e simplify() testam dezenas de transformações em cada expressão, e
+o seu custo cresce rapidamente com o número de juntas. As expressões da
+cinemática e da dinâmica dos manipuladores têm uma estrutura conhecida: são
+polinômios nas velocidades, acelerações e torques das juntas, com coeficientes
+formados por senos e cossenos dos ângulos. simplify_trig() agrupa os termos de
+cada monômio e aplica em cada coeficiente, separadamente, apenas:
+
+* TR10i: somas de produtos de senos e cossenos em senos e cossenos de somas,
+    por exemplo cos(a) cos(b) - sin(a) sin(b) = cos(a + b)
+* TR5: sin(x)^2 = 1 - cos(x)^2, quando restam potências
+
+Derivacao registra o tempo de cada etapa de uma derivação, para o relatório
+exibido por report(), e memoriza resultados intermediários: as matrizes de
+rotação de cada referencial e as suas derivadas, e a cinemática de cada ponto,
+reutilizada pelos pontos seguintes da cadeia. As subexpressões comuns das
+expressões finais são eliminadas pelo lambdify(cse=True) e pelo backend em C.
+
+As etapas independentes entre si, como a equação de Lagrange de cada
+coordenada, a simplificação de cada elemento de uma matriz e a eliminação de
+subexpressões de cada função do modelo, podem ser distribuídas entre os
+processos de um ProcessPoolExecutor com parallel_map(). Um único pool, criado
+por process_pool(), é compartilhado por todas as etapas de uma derivação, pois
+iniciar os processos custa mais que as etapas de modelos pequenos. Os processos
+recebem e retornam apenas expressões e textos, e o modelo é montado no processo
+principal, que o salva no cache.
+
+    with process_pool(workers=4) as executor:
+        mass_matrix, forcing = lagrange_equations(L, q, forces, B0, executor=executor)
+"""
+
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from sympy import Add, Derivative, Matrix, Pow, cse, expand, eye, factor_terms, zeros
+from sympy.physics.mechanics import ReferenceFrame, dynamicsymbols
+from sympy.simplify.fu import TR5, TR10i
+
+
+@contextmanager
+def process_pool(workers=1):
+    """ProcessPoolExecutor com 'workers' processos, compartilhado pelas etapas de
+    uma derivação, ou None para workers <= 1, que executa as etapas neste processo"""
+    if workers is None or workers <= 1:
+        yield None
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield executor
+
+
+def parallel_map(function, *iterables, executor=None):
+    """map(function, *iterables) distribuído entre os processos de 'executor',
+    retorna a lista dos resultados na ordem dos itens
+
+    * function: função de nível de módulo, ou um functools.partial de uma, para
+        ser enviada aos processos
+    * executor: pool criado por process_pool(). Com None, ou um único item, a
+        função é executada neste processo
+    """
+    columns = [list(iterable) for iterable in iterables]
+    if executor is None or min(len(column) for column in columns) <= 1:
+        return [function(*item) for item in zip(*columns)]
+    return list(executor.map(function, *columns))
+
+
+def _simplify_coefficient(expr):
+    """Simplificação trigonométrica de um coeficiente, sem as variáveis do monômio"""
+    expr = TR10i(expr)
+    if expr.has(Pow):
+        expr = TR10i(expand(TR5(expr)))
+    return factor_terms(expr)
+
+
+def simplify_trig(expr, variables=()):
+    """Simplifica uma expressão polinomial em 'variables' (e nas derivadas de
+    funções do tempo) com coeficientes trigonométricos
+
+    Os termos da expressão expandida são agrupados pelo seu monômio (o produto dos
+    fatores que dependem das variáveis ou de derivadas), e cada coeficiente é
+    simplificado separadamente. O resultado é equivalente ao do trigsimp() para as
+    expressões dos manipuladores, a uma fração do custo.
+    """
+    groups = defaultdict(list)
+    for term in Add.make_args(expand(expr)):
+        coefficient, monomial = term.as_independent(Derivative, *variables, as_Add=False)
+        groups[monomial].append(coefficient)
+    return Add(*[_simplify_coefficient(Add(*c)) * m for m, c in groups.items()])
+
+
+def simplify_matrix(matrix, variables=(), executor=None):
+    """simplify_trig() aplicado a cada elemento de uma matriz, com os elementos
+    distribuídos entre os processos de 'executor', ver parallel_map()"""
+    matrix = Matrix(matrix)
+    elements = parallel_map(partial(simplify_trig, variables=tuple(variables)), matrix,
+                            executor=executor)
+    return Matrix(matrix.rows, matrix.cols, elements)
+
+
+def parallel_jacobian(matrix, variables, executor=None):
+    """Jacobiano do vetor 'matrix' em relação a 'variables', com as linhas
+    calculadas em paralelo"""
+    rows = parallel_map(_gradient, matrix, [list(variables)] * len(matrix), executor=executor)
+    return Matrix(rows)
+
+
+def _gradient(expr, variables):
+    return [expr.diff(v) for v in variables]
+
+
+def generalized_forces(forcelist, frame, coordinates):
+    """Forças generalizadas Q das forças e torques de 'forcelist', como no
+    LagrangesMethod: pares (Point, força) ou (ReferenceFrame, torque)"""
+    t = dynamicsymbols._t
+    speeds = [q.diff(t) for q in coordinates]
+    forces = [0] * len(coordinates)
+    for item, force in forcelist:
+        if isinstance(item, ReferenceFrame):
+            velocity = item.ang_vel_in(frame)
+        else:
+            velocity = item.vel(frame)
+        for i, speed in enumerate(speeds):
+            forces[i] += velocity.diff(speed, frame).dot(force)
+    return forces
+
+
+def _lagrange_equation(L, coordinate, force, accelerations, variables):
+    """Linha da matriz de massa e elemento do vetor de forças da equação de
+    Lagrange de uma coordenada, d/dt(dL/dq') - dL/dq - Q = M q'' - forças"""
+    t = dynamicsymbols._t
+    equation = L.diff(coordinate.diff(t)).diff(t) - L.diff(coordinate) - force
+    mass = [simplify_trig(equation.diff(a), variables) for a in accelerations]
+    forcing = simplify_trig(-equation.subs(dict.fromkeys(accelerations, 0)), variables)
+    return mass, forcing
+
+
+def lagrange_equations(L, coordinates, forcelist, frame, variables=(), executor=None):
+    """Equações de Lagrange M(q, q') q'' = forças(q, q'), uma coordenada por processo
+
+    Equivale ao form_lagranges_equations() do LagrangesMethod, sem restrições,
+    seguido da simplificação de M e das forças com simplify_trig(). Cada processo
+    deriva e simplifica a equação de uma coordenada.
+
+    * L: Lagrangiano
+    * coordinates: coordenadas generalizadas, funções do tempo
+    * forcelist: forças e torques no formato do LagrangesMethod
+    * frame: referencial inercial
+    * variables: demais variáveis polinomiais das equações, como os torques
+    * executor: pool criado por process_pool(), None deriva neste processo
+
+    Retorna (mass_matrix, forcing).
+    """
+    t = dynamicsymbols._t
+    n = len(coordinates)
+    accelerations = [q.diff(t, 2) for q in coordinates]
+    forces = generalized_forces(forcelist, frame, coordinates)
+    rows = parallel_map(_lagrange_equation, [L] * n, coordinates, forces,
+                        [accelerations] * n, [tuple(variables)] * n, executor=executor)
+    mass_matrix = Matrix([mass for mass, _ in rows])
+    forcing = Matrix([forcing for _, forcing in rows])
+    return mass_matrix, forcing
+
+
+def parallel_cse(expressions, executor=None):
+    """Eliminação de subexpressões comuns de cada expressão, uma por processo
+
+    Retorna, para cada expressão, uma função no formato do argumento cse do
+    lambdify, que devolve o resultado já calculado:
+
+        cses = parallel_cse([rhs, jacobian])
+        f_rhs = lambdify(args, rhs, cse=cses[0])
+    """
+    results = parallel_map(partial(cse, list=False), expressions, executor=executor)
+    return [lambda expr, result=result: result for result in results]
+
+
+class Derivacao:
+    """Etapas de uma derivação simbólica, com o tempo de cada uma e os resultados
+    intermediários memorizados
+
+    * name: nome da derivação, exibido no relatório
+
+        derivacao = Derivacao('SCARA')
+        with derivacao.stage('Cinemática'):
+            r_B, v_B, a_B = derivacao.point('B', B0, 'A', l_1 * B1.x)
+        derivacao.report()
+    """
+    def __init__(self, name):
+        self.name = name
+        self.times = {}
+        self.hits = 0
+        self._memo = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Mede o tempo da etapa 'name', somado caso a etapa se repita"""
+        initial_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - initial_time
+            self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def memo(self, key, function):
+        """Resultado de function() memorizado com a chave 'key'"""
+        if key in self._memo:
+            self.hits += 1
+            return self._memo[key]
+        result = self._memo[key] = function()
+        return result
+
+    def rotation(self, frame, base):
+        """Matriz de rotação de 'frame' para 'base' e as suas duas primeiras derivadas
+        no tempo, simplificadas e memorizadas por referencial
+
+        As matrizes de um referencial são obtidas das do referencial anterior no
+        caminho desde 'base' e da rotação local entre os dois, R = R_anterior R_local,
+        de forma que cada junta acrescenta apenas uma rotação simples.
+        """
+        def derive():
+            t = dynamicsymbols._t
+            if frame == base:
+                return eye(3), zeros(3, 3), zeros(3, 3)
+            # Caminho de referenciais de base até frame, como no dcm() do Sympy
+            parent = base._dict_list(frame, 0)[-2]
+            P, P_d, P_dd = self.rotation(parent, base)
+            local = parent.dcm(frame)
+            local_d = local.diff(t)
+            R = simplify_matrix(P * local)
+            R_d = simplify_matrix(P_d * local + P * local_d)
+            R_dd = simplify_matrix(P_dd * local + 2 * P_d * local_d + P * local_d.diff(t))
+            return R, R_d, R_dd
+        return self.memo(('rotation', frame, base), derive)
+
+    def point(self, name, base, parent=None, link=None):
+        """Posição, velocidade e aceleração do ponto 'name' em relação ao
+        referencial 'base', com r = r_parent + link
+
+        * parent: nome de um ponto já derivado, ou None para a origem
+        * link: Vector do ponto 'parent' até o ponto 'name'
+
+        Apenas as derivadas de 'link' são calculadas, a partir das rotações
+        memorizadas de cada referencial em que ele é expresso, e somadas às do ponto
+        anterior, sem derivar novamente a posição completa. Retorna as matrizes
+        (r, v, a) com os componentes em 'base'.
+        """
+        def derive():
+            if parent is None:
+                r, v, a = zeros(3, 1), zeros(3, 1), zeros(3, 1)
+            else:
+                try:
+                    r, v, a = self._memo[('point', parent, base)]
+                    self.hits += 1
+                except KeyError:
+                    raise ValueError('Ponto %s ainda não foi derivado' % parent) from None
+            t = dynamicsymbols._t
+            for measures, frame in (link.args if link is not None else []):
+                R, R_d, R_dd = self.rotation(frame, base)
+                m_d, m_dd = measures.diff(t), measures.diff(t, 2)
+                r = r + R * measures
+                v = v + R_d * measures + R * m_d
+                a = a + R_dd * measures + 2 * R_d * m_d + R * m_dd
+            return simplify_matrix(r), simplify_matrix(v), simplify_matrix(a)
+        return self.memo(('point', name, base), derive)
+
+    def report(self):
+        """Exibe o tempo de cada etapa e o total"""
+        total = sum(self.times.values())
+        print('Derivação: %s' % self.name)
+        for name, elapsed in self.times.items():
+            share = 100 * elapsed / total if total > 0 else 0.0
+            print('  %-32s %8.3f s %5.1f%%' % (name, elapsed, share))
+        print('  %-32s %8.3f s (resultados reutilizados: %d)' % ('Total', total, self.hits))
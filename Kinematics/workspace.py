@@ -0,0 +1,179 @@
+"""
+Espaço de trabalho dos manipuladores amostrado no espaço das juntas.
+
+As juntas são amostradas em uma grade, a cinemática direta vetorizada calcula
+a posição da ponta em cada configuração e os pontos são indexados em uma
+k-d tree (scipy.spatial.cKDTree). Com isso, para qualquer ponto alvo, a
+configuração amostrada cuja ponta está mais próxima é encontrada em
+O(log n), e serve como:
+
+* estimativa inicial para a cinemática inversa numérica, que a partir dela
+    converge em poucas iterações, e na solução esperada
+* teste de alcance, pela distância do alvo ao ponto amostrado mais próximo,
+    comparada ao maior erro que a grade pode ter (ver EspacoDeTrabalho.sample)
+
+A amostragem pode ser salva em um arquivo .npz, junto dos parâmetros do
+manipulador e da grade, e carregada nas execuções seguintes com os mesmos
+parâmetros, caso contrário ela é refeita.
+
+    espaco = antropomorfico(file_name='antropomorfico.npz')
+    q, error = antropomorfico_dls(targets, espaco.seeds(targets))
+"""
+
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from inverse_kinematics import antropomorfico_fk, scara_fk
+
+
+class EspacoDeTrabalho:
+    """Pontos alcançáveis pela ponta e as configurações das juntas de cada um
+
+    * points: posições da ponta no formato (P, 3)
+    * configurations: ângulos das juntas de cada ponto no formato (P, n)
+    * parameters: array com os parâmetros da amostragem (comprimentos, limites e
+        resolução), salvo com os pontos para verificar se o arquivo ainda é válido
+    * spacing: maior distância entre um ponto alcançável e o ponto amostrado mais
+        próximo, calculada por sample(). Com None ela é estimada pela distância
+        entre os pontos vizinhos, sem garantia para pontos entre eles
+    """
+    def __init__(self, points, configurations, parameters=None, spacing=None):
+        self.points = np.asarray(points, dtype='float')
+        self.configurations = np.asarray(configurations, dtype='float')
+        self.parameters = None if parameters is None else np.asarray(parameters, dtype='float')
+        self.tree = cKDTree(self.points, balanced_tree=False, compact_nodes=False)
+        self.spacing = self._spacing() if spacing is None else float(spacing)
+
+    @classmethod
+    def sample(cls, forward, limits, resolution=64):
+        """Amostra o espaço das juntas em uma grade regular
+
+        * forward: cinemática direta vetorizada, q (P, n) -> posições (P, 3)
+        * limits: lista de limites (mínimo, máximo) de cada junta
+        * resolution: amostras por junta, um inteiro ou um por junta
+
+        Juntas com volta completa (máximo - mínimo >= 2 pi) não repetem o
+        ângulo final, que coincide com o inicial. Configurações que levam a ponta
+        ao mesmo ponto (como theta_1 + pi com o braço inclinado para trás no braço
+        antropomórfico) são mantidas uma única vez, o que reduz a árvore sem
+        alterar as estimativas iniciais.
+
+        spacing é o maior erro da grade: uma configuração qualquer está a no máximo
+        meio passo dq_j de um vértice em cada junta, e girar a junta j move a ponta
+        no máximo r_j dq_j / 2, com r_j a maior distância da ponta ao eixo da junta.
+        r_j é obtido das cordas entre vértices vizinhos da junta j, 2 r sen(dq_j / 2),
+        e spacing = soma de r_j dq_j / 2 (juntas de rotação).
+        """
+        resolution = np.broadcast_to(resolution, (len(limits),))
+        axes = [np.linspace(low, high, k, endpoint=high - low < 2 * np.pi)
+                for (low, high), k in zip(limits, resolution)]
+        grid = np.meshgrid(*axes, indexing='ij')
+        q = np.stack([g.ravel() for g in grid], axis=-1)
+        points = forward(q)
+        spacing = 0.0
+        for j, axis in enumerate(axes):
+            if len(axis) < 2:
+                continue
+            step = axis[1] - axis[0]
+            chords = np.linalg.norm(np.diff(points.reshape(grid[0].shape + (-1,)), axis=j),
+                                    axis=-1)
+            radius = chords.max() / (2 * np.sin(step / 2))
+            spacing += radius * step / 2
+        _, unique = np.unique(np.round(points, 9), axis=0, return_index=True)
+        unique.sort()
+        return cls(points[unique], q[unique], spacing=spacing)
+
+    def _spacing(self, samples=4096):
+        """Maior distância entre um ponto e o seu vizinho mais próximo, estimada em
+        uma amostra dos pontos, a resolução da amostragem no espaço cartesiano"""
+        rng = np.random.default_rng(0)
+        subset = rng.choice(len(self.points), min(samples, len(self.points)), replace=False)
+        distances, _ = self.tree.query(self.points[subset], k=2)
+        return float(distances[:, 1].max())
+
+    def nearest(self, targets, k=1):
+        """Distâncias e configurações dos k pontos amostrados mais próximos dos alvos
+
+        Retorna (distances, configurations), nos formatos (...) e (..., n) para
+        k = 1, ou (..., k) e (..., k, n).
+        """
+        targets = np.asarray(targets, dtype='float')
+        distances, index = self.tree.query(targets, k=k, workers=-1)
+        return distances, self.configurations[index]
+
+    def seeds(self, targets):
+        """Estimativas iniciais da cinemática inversa para os alvos (..., 3)"""
+        return self.nearest(targets)[1]
+
+    def reachable(self, targets, tolerance=None):
+        """Se os alvos estão a menos de 'tolerance' de um ponto amostrado, por
+        padrão o maior erro da grade (self.spacing)
+
+        Com a tolerância padrão nenhum ponto alcançável é rejeitado, mas pontos
+        fora do espaço de trabalho a menos de self.spacing da borda são aceitos.
+        """
+        if tolerance is None:
+            tolerance = self.spacing
+        return self.nearest(targets)[0] <= tolerance
+
+    def save(self, file_name):
+        """Salva os pontos, as configurações e os parâmetros em um arquivo .npz"""
+        arrays = dict(points=self.points, configurations=self.configurations,
+                      spacing=self.spacing)
+        if self.parameters is not None:
+            arrays['parameters'] = self.parameters
+        np.savez(_npz(file_name), **arrays)
+
+    @classmethod
+    def load(cls, file_name):
+        """Carrega um espaço de trabalho salvo por save(), reconstruindo a árvore"""
+        with np.load(_npz(file_name)) as data:
+            parameters = data['parameters'] if 'parameters' in data else None
+            spacing = data['spacing'] if 'spacing' in data else None
+            return cls(data['points'], data['configurations'], parameters, spacing)
+
+
+def _npz(file_name):
+    """Nome do arquivo com a extensão .npz, que o np.savez acrescenta caso falte"""
+    return file_name if file_name.endswith('.npz') else file_name + '.npz'
+
+
+def _sample_or_load(file_name, forward, limits, resolution, lengths):
+    """Carrega o espaço de trabalho de file_name caso ele tenha sido amostrado com
+    os mesmos comprimentos, limites e resolução (e salvo com o spacing da grade),
+    caso contrário o amostra e salva"""
+    parameters = np.concatenate([np.ravel(lengths), np.ravel(limits),
+                                 np.broadcast_to(resolution, (len(limits),))]).astype('float')
+    if file_name is not None:
+        file_name = _npz(file_name)
+        if os.path.exists(file_name):
+            with np.load(file_name) as data:
+                current = 'spacing' in data
+            espaco = EspacoDeTrabalho.load(file_name)
+            if (current and espaco.parameters is not None
+                    and espaco.parameters.shape == parameters.shape
+                    and np.allclose(espaco.parameters, parameters)):
+                return espaco
+    espaco = EspacoDeTrabalho.sample(forward, limits, resolution)
+    espaco.parameters = parameters
+    if file_name is not None:
+        espaco.save(file_name)
+    return espaco
+
+
+def scara(l_1=1.0, l_2=0.8, resolution=512, limits=((-np.pi, np.pi), (-np.pi, np.pi)),
+          file_name=None):
+    """Espaço de trabalho do SCARA, com os comprimentos L1 e L2 de Manipulador2GdL.
+    Caso file_name exista e tenha os mesmos parâmetros ele é carregado, caso
+    contrário a amostragem é salva nele"""
+    return _sample_or_load(file_name, lambda q: scara_fk(q, l_1, l_2), limits, resolution,
+                           (l_1, l_2))
+
+
+def antropomorfico(l_1=1.0, l_2=0.8, resolution=64, limits=((-np.pi, np.pi),) * 3,
+                   file_name=None):
+    """Espaço de trabalho do braço antropomórfico, ver scara()"""
+    return _sample_or_load(file_name, lambda q: antropomorfico_fk(q, l_1, l_2), limits,
+                           resolution, (l_1, l_2))
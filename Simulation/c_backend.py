@@ -0,0 +1,175 @@
+"""
+Backend opcional em C para as equações dos manipuladores.
+
+As expressões simbólicas obtidas em derive_dynamics() são convertidas em código
+C pelo Sympy, compiladas em uma biblioteca compartilhada e carregadas com ctypes.
+A biblioteca é salva no mesmo diretório do cache dos modelos, identificada pelo
+hash do código gerado, e só é compilada novamente quando as equações mudam.
+"""
+
+import ctypes
+import hashlib
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+
+from model_cache import ModelCache
+
+# Compilador C utilizado, pode ser alterado pela variável de ambiente CC
+CC = os.environ.get("CC", "cc")
+CFLAGS = ["-O3", "-shared", "-fPIC"]
+
+_double_p = ctypes.POINTER(ctypes.c_double)
+
+
+def _c_function(name, matrix, subs):
+    """Código C de uma função que avalia 'matrix' (em ordem de linhas) em out"""
+    from sympy import ccode, cse
+    exprs = [e.xreplace(subs) for e in matrix]
+    replacements, reduced = cse(exprs)
+    lines = ["static void %s(const double *x, const double *u, const double *p, double *out)" % name,
+             "{"]
+    for sym, e in replacements:
+        lines.append("    const double %s = %s;" % (sym, ccode(e)))
+    for i, e in enumerate(reduced):
+        lines.append("    out[%d] = %s;" % (i, ccode(e)))
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def _c_batch_function(name, n_x, n_u, n_out):
+    """Código C que avalia a função 'name' para n estados, com parâmetros comuns"""
+    return "\n".join([
+        "void %s_batch(int n, const double *x, const double *u, const double *p, double *out)" % name,
+        "{",
+        "    for (int k = 0; k < n; k++)",
+        "        %s(x + k * %d, u + k * %d, p, out + k * %d);" % (name, n_x, n_u, n_out),
+        "}",
+        "void %s_single(const double *x, const double *u, const double *p, double *out)" % name,
+        "{",
+        "    %s(x, u, p, out);" % name,
+        "}",
+    ])
+
+
+def generate_source(prefix, args, rhs, mass_matrix, jacobian, map_function=map, **functions):
+    """Gera o código C das funções do modelo
+
+    * prefix: prefixo do nome das funções em C
+    * args: símbolos dos (estados, entradas, parâmetros) do modelo
+    * rhs, mass_matrix, jacobian: matrizes simbólicas a serem convertidas
+    * map_function: função com a assinatura do map(), utilizada para gerar o código
+        de cada função, por exemplo distribuído entre processos
+    * functions: outras matrizes do modelo, convertidas em funções de mesmo nome
+
+    Retorna um dicionário com o código e as dimensões das funções, que é salvo
+    junto do modelo no cache para que o Sympy não seja necessário ao carregá-lo.
+    """
+    from sympy import MatrixSymbol
+    states, inputs, params = args
+    x = MatrixSymbol("x", len(states), 1)
+    u = MatrixSymbol("u", len(inputs), 1)
+    p = MatrixSymbol("p", len(params), 1)
+    subs = {}
+    for vector, symbols in ((x, states), (u, inputs), (p, params)):
+        for i, s in enumerate(symbols):
+            subs[s] = vector[i, 0]
+
+    blocks = ["#include <math.h>"]
+    shapes = {}
+    functions = dict(rhs=rhs, mass_matrix=mass_matrix, jacobian=jacobian, **functions)
+    names = [prefix + "_" + function for function in functions]
+    # Cada função recebe e retorna apenas expressões e texto
+    codes = map_function(_c_function, names, functions.values(), [subs] * len(names))
+    for (function, matrix), name, code in zip(functions.items(), names, codes):
+        blocks.append(code)
+        blocks.append(_c_batch_function(name, len(states), len(inputs), len(matrix)))
+        shapes[function] = (matrix.shape[0],) if matrix.shape[1] == 1 else tuple(matrix.shape)
+    return {"prefix": prefix, "source": "\n\n".join(blocks) + "\n",
+            "n_x": len(states), "n_u": len(inputs), "n_p": len(params), "shapes": shapes}
+
+
+def build_library(prefix, source, directory=None):
+    """Compila o código C em uma biblioteca compartilhada, caso ela ainda não exista
+    no diretório do cache, e retorna o seu caminho"""
+    directory = directory or ModelCache().directory
+    digest = hashlib.sha256((" ".join([CC] + CFLAGS) + source).encode("utf-8")).hexdigest()[:16]
+    lib_name = os.path.join(directory, prefix + "_" + digest + ".so")
+    if os.path.exists(lib_name):
+        return lib_name
+
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=directory) as build_dir:
+        src_name = os.path.join(build_dir, prefix + ".c")
+        tmp_lib = os.path.join(build_dir, prefix + ".so")
+        with open(src_name, "w") as f:
+            f.write(source)
+        result = subprocess.run([CC] + CFLAGS + ["-o", tmp_lib, src_name, "-lm"],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError("Falha ao compilar o modelo em C:\n" + result.stderr)
+        # Renomeação atômica, outros processos nunca carregam uma biblioteca incompleta
+        os.replace(tmp_lib, lib_name)
+    return lib_name
+
+
+class _CFunction:
+    """Função compilada em C, avaliada para um estado ou para um lote de estados"""
+    def __init__(self, lib, name, shape, n_x, n_u, n_p):
+        self.shape = shape
+        self.n_x = n_x
+        self.n_u = n_u
+        self._single = getattr(lib, name + "_single")
+        self._single.argtypes = [_double_p] * 4
+        self._single.restype = None
+        self._batch = getattr(lib, name + "_batch")
+        self._batch.argtypes = [ctypes.c_int] + [_double_p] * 4
+        self._batch.restype = None
+        # Buffers reutilizados a cada avaliação de um único estado, evitando a
+        # conversão de arrays do NumPy em ponteiros a cada chamada
+        self._x = (ctypes.c_double * n_x)()
+        self._u = (ctypes.c_double * n_u)()
+        self._p = (ctypes.c_double * n_p)()
+        self._out = (ctypes.c_double * int(np.prod(shape)))()
+        self._out_view = np.ctypeslib.as_array(self._out).reshape(shape)
+
+    def __call__(self, x, u, p):
+        """Avalia a função em um estado x, entradas u e parâmetros p"""
+        self._x[:] = x
+        self._u[:] = u
+        self._p[:] = p
+        self._single(self._x, self._u, self._p, self._out)
+        return self._out_view.copy()
+
+    def batch(self, x, u, p):
+        """Avalia a função para N estados x (N, n) e entradas u (N, m) com os mesmos
+        parâmetros p, retorna um array no formato (N, *shape)"""
+        x = np.ascontiguousarray(x, dtype=np.float64).reshape(-1, self.n_x)
+        n = len(x)
+        u = np.ascontiguousarray(np.broadcast_to(u, (n, self.n_u)), dtype=np.float64)
+        p = np.ascontiguousarray(p, dtype=np.float64)
+        out = np.empty((n,) + self.shape)
+        self._batch(n, x.ctypes.data_as(_double_p), u.ctypes.data_as(_double_p),
+                    p.ctypes.data_as(_double_p), out.ctypes.data_as(_double_p))
+        return out
+
+
+class CModel:
+    """Modelo dinâmico compilado em C
+
+    * code: dicionário com o código C retornado por generate_source()
+    * directory: diretório onde a biblioteca compilada é salva
+
+    Expõe as funções rhs(x, u, p), mass_matrix(x, u, p) e jacobian(x, u, p),
+    além das demais funções geradas, cada uma com um método batch() para lotes
+    de estados.
+    """
+    def __init__(self, code, directory=None):
+        prefix = code["prefix"]
+        self.library = build_library(prefix, code["source"], directory)
+        lib = ctypes.CDLL(self.library)
+        for function, shape in code["shapes"].items():
+            setattr(self, function, _CFunction(lib, prefix + "_" + function, shape,
+                                               code["n_x"], code["n_u"], code["n_p"]))
@@ -0,0 +1,35 @@
+"""
+Integradores numéricos vetorizados, utilizados para simular vários estados
+iniciais dos manipuladores de uma só vez.
+"""
+
+import numpy as np
+
+
+def rk4_batch(f, t_eval, y0, substeps=1):
+    """Integra o sistema dy/dt = f(t, y) para um lote de estados iniciais com
+    Runge-Kutta de 4ª ordem de passo fixo.
+
+    * f: função f(t, y) vetorizada, y no formato (N, n) e retorno no mesmo formato
+    * t_eval: instantes em que a solução é salva, sendo t_eval[0] o instante inicial
+    * y0: estados iniciais no formato (N, n)
+    * substeps: número de passos do Runge-Kutta entre dois instantes de t_eval
+
+    Retorna a solução no formato (N, n, T), sendo T = len(t_eval).
+    """
+    t_eval = np.asarray(t_eval, dtype='float')
+    y = np.array(y0, dtype='float', ndmin=2)
+    solution = np.empty(y.shape + (len(t_eval),))
+    solution[..., 0] = y
+    for i in range(1, len(t_eval)):
+        t = t_eval[i - 1]
+        h = (t_eval[i] - t) / substeps
+        for _ in range(substeps):
+            k1 = f(t, y)
+            k2 = f(t + h / 2, y + h / 2 * k1)
+            k3 = f(t + h / 2, y + h / 2 * k2)
+            k4 = f(t + h, y + h * k3)
+            y = y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+            t += h
+        solution[..., i] = y
+    return solution
@@ -0,0 +1,199 @@
+"""
+Cache em disco dos modelos dinâmicos calculados com o Sympy.
+
+Cada modelo é salvo em um arquivo cujo nome contém um hash da sua definição
+(código fonte da função que o calcula e dos módulos que ela utiliza, como o
+gerador de código em C) e das versões do Python, Sympy e Dill, de forma que
+qualquer alteração no modelo ou no ambiente gera uma nova entrada em vez de
+carregar um resultado incompatível.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+import dill
+dill.settings['recurse'] = True
+
+# Versão do formato dos arquivos salvos, deve ser incrementada caso ele mude
+CACHE_VERSION = 1
+# Assinatura no início de cada arquivo, seguida do sha256 do conteúdo
+MAGIC = b"ROBOMODEL"
+# Diretório padrão do cache, pode ser alterado pela variável de ambiente
+DEFAULT_DIR = os.environ.get(
+    "ROBOTICS_MODEL_CACHE",
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "models"))
+# Tamanho máximo do diretório do cache (bytes)
+DEFAULT_MAX_SIZE = 64 * 1024 ** 2
+
+
+def _package_version(name):
+    """Versão de um pacote instalado, sem precisar importá-lo"""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "none"
+
+
+def _definition_source(definition):
+    """Código que identifica a função 'definition', estável entre execuções: o seu
+    código fonte ou, caso ele não esteja disponível, o seu nome qualificado. De um
+    functools.partial é utilizada a função e os argumentos fixados"""
+    if isinstance(definition, functools.partial):
+        return "|".join([_definition_source(definition.func), repr(definition.args),
+                         repr(sorted(definition.keywords.items()))])
+    try:
+        return inspect.getsource(definition)
+    except (OSError, TypeError):
+        kind = definition if inspect.isclass(definition) else type(definition)
+        return ".".join([getattr(definition, "__module__", kind.__module__),
+                         getattr(definition, "__qualname__", kind.__qualname__)])
+
+
+class ModelCache:
+    """Cache dos modelos dinâmicos em disco
+
+    * directory: diretório onde os modelos são salvos
+    * max_size: tamanho máximo do diretório em bytes, os modelos usados há mais
+        tempo são removidos quando ele é ultrapassado
+    """
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or DEFAULT_DIR
+        self.max_size = max_size
+
+    def file_name(self, name, definition, dependencies=()):
+        """Caminho do arquivo do modelo 'name' calculado pela função 'definition'
+
+        * dependencies: caminhos dos arquivos de código utilizados por definition,
+            cujo conteúdo também identifica o modelo
+        """
+        source = _definition_source(definition)
+        sources = []
+        for dependency in dependencies:
+            try:
+                with open(dependency, encoding="utf-8") as f:
+                    sources.append(f.read())
+            except OSError:
+                sources.append(dependency)
+        key = "|".join([
+            str(CACHE_VERSION),
+            "%d.%d" % sys.version_info[:2],
+            _package_version("sympy"),
+            _package_version("dill"),
+            source,
+        ] + sources)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, name + "_" + digest + ".data")
+
+    def load(self, name, definition, dependencies=()):
+        """Carrega o modelo do disco, retorna None caso ele não exista ou esteja corrompido"""
+        file_name = self.file_name(name, definition, dependencies)
+        try:
+            with open(file_name, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        header = len(MAGIC) + hashlib.sha256().digest_size
+        payload = data[header:]
+        if (data[:len(MAGIC)] != MAGIC or
+                data[len(MAGIC):header] != hashlib.sha256(payload).digest()):
+            print("Modelo em " + file_name + " está corrompido e será recalculado.")
+            self._remove(file_name)
+            return None
+        try:
+            model = dill.loads(payload)
+        except Exception as error:
+            print("Modelo em " + file_name + " não pôde ser carregado (" +
+                  repr(error) + ") e será recalculado.")
+            self._remove(file_name)
+            return None
+        # Marca o modelo como usado recentemente para a política de remoção, o que
+        # não é possível em um cache compartilhado somente para leitura
+        try:
+            os.utime(file_name)
+        except OSError:
+            pass
+        return model
+
+    def save(self, name, definition, model, dependencies=()):
+        """Salva o modelo no disco de forma atômica e retorna o caminho do arquivo"""
+        file_name = self.file_name(name, definition, dependencies)
+        payload = dill.dumps(model)
+        os.makedirs(self.directory, exist_ok=True)
+        # Escreve em um arquivo temporário no mesmo diretório e o renomeia, assim
+        # outros processos nunca leem um arquivo parcialmente escrito
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.chmod(tmp_name, 0o644)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC)
+                f.write(hashlib.sha256(payload).digest())
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, file_name)
+        except BaseException:
+            self._remove(tmp_name)
+            raise
+        self.evict(keep=file_name)
+        return file_name
+
+    def load_or_build(self, name, definition, dependencies=(), **options):
+        """Carrega o modelo do cache ou o calcula através de definition() e o salva,
+        ver file_name() para dependencies
+
+        * options: argumentos passados a definition() que não alteram o modelo, como
+            o número de processos da derivação, e por isso não fazem parte da chave
+        """
+        model = self.load(name, definition, dependencies)
+        if model is not None:
+            return model
+        print("Modelo dinâmico ainda não foi calculado. Aguarde...")
+        initial_time = time.time()
+        model = definition(**options)
+        try:
+            file_name = self.save(name, definition, model, dependencies)
+        except OSError as error:
+            # Cache somente para leitura ou sem espaço: o modelo calculado é utilizado
+            # mesmo assim, e será calculado novamente na próxima execução
+            print("Modelo calculado, mas não pôde ser salvo no cache (" + str(error) +
+                  "). Tempo: " + str(time.time() - initial_time))
+            return model
+        print("Modelo calculado e salvo em " + file_name + ". Tempo: " +
+              str(time.time() - initial_time))
+        return model
+
+    def evict(self, keep=None):
+        """Remove os modelos usados há mais tempo até o cache caber em max_size"""
+        try:
+            entries = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                       if f.endswith((".data", ".so"))]
+        except FileNotFoundError:
+            return
+        stats = []
+        for entry in entries:
+            try:
+                stats.append((os.path.getmtime(entry), os.path.getsize(entry), entry))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in stats)
+        for _, size, entry in sorted(stats):
+            if total <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            self._remove(entry)
+            total -= size
+
+    @staticmethod
+    def _remove(file_name):
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
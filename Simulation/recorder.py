@@ -0,0 +1,99 @@
+"""
+Registro das grandezas de uma simulação em arrays pré-alocados do NumPy.
+
+Substitui as listas que crescem a cada quadro: cada grandeza é armazenada em um
+array, e as leituras retornam views desse array, sem cópias, que podem ser
+passadas diretamente ao set_data() do Matplotlib ou salvas em disco.
+
+No modo janela (rolling=True) apenas as últimas 'capacity' amostras são mantidas.
+Cada amostra é escrita duas vezes, nas posições i e i + capacity de um buffer com
+o dobro do tamanho, de forma que a janela é sempre um trecho contíguo do buffer
+e também pode ser lida sem cópias.
+"""
+
+import numpy as np
+
+
+class Registro:
+    """Registro de amostras de várias grandezas de uma simulação
+
+    * fields: dicionário {nome: formato} de cada grandeza, com formato () para
+        escalares, um inteiro para vetores ou uma tupla
+    * capacity: número de amostras pré-alocadas. Caso seja ultrapassado, os arrays
+        dobram de tamanho, ou, no modo janela, as amostras mais antigas são descartadas
+    * rolling: mantém apenas as últimas 'capacity' amostras
+
+    As amostras são lidas como atributos ou itens, registro.time ou registro["time"],
+    em ordem cronológica.
+    """
+    __slots__ = ("fields", "capacity", "rolling", "_buffers", "_count", "_pos")
+
+    def __init__(self, fields, capacity=1024, rolling=False):
+        self.fields = {name: (shape,) if isinstance(shape, int) else tuple(shape)
+                       for name, shape in fields.items()}
+        self.capacity = int(capacity)
+        self.rolling = rolling
+        size = 2 * self.capacity if rolling else self.capacity
+        self._buffers = {name: np.empty((size,) + shape) for name, shape in self.fields.items()}
+        self._count = 0
+        self._pos = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity) if self.rolling else self._count
+
+    def append(self, *values):
+        """Registra uma amostra, com um valor para cada grandeza na ordem de fields"""
+        pos = self._pos
+        if self.rolling:
+            mirror = pos + self.capacity
+            for buffer, value in zip(self._buffers.values(), values):
+                buffer[pos] = value
+                buffer[mirror] = value
+            self._pos = (pos + 1) % self.capacity
+        else:
+            if pos == self.capacity:
+                self._grow()
+            for buffer, value in zip(self._buffers.values(), values):
+                buffer[pos] = value
+            self._pos = pos + 1
+        self._count += 1
+
+    def _grow(self):
+        """Dobra a capacidade dos arrays, custo amortizado constante por amostra"""
+        self.capacity *= 2
+        for name, buffer in self._buffers.items():
+            grown = np.empty((self.capacity,) + buffer.shape[1:])
+            grown[:len(buffer)] = buffer
+            self._buffers[name] = grown
+
+    def clear(self):
+        """Descarta todas as amostras, mantendo os arrays alocados"""
+        self._count = 0
+        self._pos = 0
+
+    def view(self, name):
+        """View, sem cópia, das amostras da grandeza 'name' em ordem cronológica"""
+        buffer = self._buffers[name]
+        if self.rolling and self._count >= self.capacity:
+            return buffer[self._pos:self._pos + self.capacity]
+        return buffer[:len(self)]
+
+    def __getitem__(self, name):
+        return self.view(name)
+
+    def __getattr__(self, name):
+        # Chamado apenas para nomes que não são atributos da classe
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.view(name)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def as_dict(self):
+        """Dicionário {nome: view} de todas as grandezas"""
+        return {name: self.view(name) for name in self.fields}
+
+    def save(self, file_name):
+        """Salva as amostras em um arquivo .npz"""
+        np.savez(file_name, **self.as_dict())
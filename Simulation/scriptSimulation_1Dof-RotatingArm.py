@@ -9,17 +9,23 @@ email: nandohfernandes@gmail.com
 """
 
 from numpy import sin, cos, pi
+import os
+import sys
 import numpy as np
-import dill, os, time
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint, solve_ivp
-from scipy.misc import derivative
-import matplotlib.animation as animation
-from sympy import symbols, pprint, simplify, Derivative, lambdify, Dummy
-from sympy.physics.mechanics import *
-from sympy.physics.mechanics.functions import inertia
-dill.settings['recurse'] = True
+# Módulo de derivação simbólica compartilhado com a cinemática
+KINEMATICS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'Kinematics')
+sys.path.append(KINEMATICS_DIR)
+from model_cache import ModelCache
+from c_backend import CModel
+import c_backend
+
+# Módulos utilizados por derive_dynamics(), cujo código também identifica o modelo
+# no cache: alterações neles não reutilizam modelos ou códigos em C antigos
+MODEL_DEPENDENCIES = (c_backend.__file__, os.path.join(KINEMATICS_DIR, 'symbolic.py'))
         
+# Métodos da EDO que utilizam o Jacobiano, os demais ignoram o argumento jac
+IMPLICIT_METHODS = ('LSODA', 'Radau', 'BDF')
+
 class Manipulador1GdL:
     """Classe do Manipulador de 1 Grau de Liberdade
 
@@ -37,8 +43,10 @@ class Manipulador1GdL:
                  T = 0.0,                     # Torque aplicado
                  edo_method = 'LSODA',        # Método de resolução da EDO.
                                               # ('LSODA', 'RK45', 'RK23', 'Radau' or 'BDF')
+                 backend = 'numpy',           # Backend das equações ('numpy' ou 'c', compilado em C)
                  origin = (0, 0)):
         self.edo_method = edo_method
+        self.backend = backend
         self.init_state = np.deg2rad(np.asarray(init_state, dtype='float'))
         self.num_params = (L, R, I, M, G)
         self.torque = T
@@ -47,7 +55,9 @@ class Manipulador1GdL:
         self.thetas = []
         self.omegas = []
         self.time = []        
-        self.rhs_lambdified = []
+        self.rhs_lambdified = None
+        self.jac_lambdified = None
+        self.c_model = None
         # frames por segundo da animação
         self.fps = 1./60    
         self.solution_edo = False
@@ -56,8 +66,33 @@ class Manipulador1GdL:
     
     # Solução da Dinâmica do Manipulador
     def solve_dynamics(self):    
+        """Carrega a solução da dinâmica do manipulador do cache em disco, ou a
+        calcula caso ela ainda não exista"""
+        model = ModelCache().load_or_build("rotatingarm_dynamics", self.derive_dynamics,
+                                           MODEL_DEPENDENCIES)
+        self.rhs_lambdified = model["rhs"]
+        self.jac_lambdified = model["jacobian"]
+        self.c_model = None
+        if self.backend == 'c':
+            try:
+                self.c_model = CModel(model["c_code"])
+            except (OSError, RuntimeError, AttributeError) as error:
+                print("Backend em C indisponível, utilizando o NumPy. " + str(error))
+
+    @staticmethod
+    def derive_dynamics():
         """Calcula a solução da dinâmica do manipulador e já coloca em
          formato pronto para ser calculado """
+        # O Sympy só é importado quando o modelo ainda não está no cache
+        from sympy import symbols, lambdify, Dummy, Array
+        from sympy.physics.mechanics import (dynamicsymbols, ReferenceFrame, Point, RigidBody,
+                                             Lagrangian, LagrangesMethod, inertia, msubs)
+        from c_backend import generate_source
+        from symbolic import Derivacao, simplify_trig
+
+        # Tempo de cada etapa, exibido ao fim da derivação
+        derivacao = Derivacao('Dinâmica do braço rotativo')
+
         # Variáveis Simbólicas do problema
         theta = dynamicsymbols('theta')
         dtheta = dynamicsymbols('theta', 1)
@@ -69,19 +104,6 @@ class Manipulador1GdL:
         m, g = symbols('m g')
         I_xx, I_yy, I_zz = symbols('I_{xx}, I_{yy}, I_{zz}') 
         symb_params = (l, r, I_zz, m, g)
-        
-        # Nome do arquivo salvo com a equação do movimento
-        here = os.path.dirname(os.path.realpath(__file__))
-        file_name = (here + "\\models\\rotatingarm_dynamics_" + 
-                    "".join(str(e) + "_" for e in self.num_params) + ".data")
-        # Verifica se a solução já foi calculada antes
-        try:
-            rhs = dill.load(open(file_name, "rb"))
-            self.rhs_lambdified = rhs
-            return
-        except:
-            print("Modelo dinâmico ainda não foi calculado para esses parâmetros. Aguarde...")
-        initial_time = time.time()
 
         # Referenciais 
         B0 = ReferenceFrame('B0')                         # Referencial Inercial
@@ -104,40 +126,61 @@ class Manipulador1GdL:
 
         # Forças/Momentos Generalizados
         FL = [(B1, tau * B0.z)]
-        # Método de Lagrange
-        L = Lagrangian(B0, E).simplify()
-        LM = LagrangesMethod(L, [theta], frame=B0, forcelist = FL)        
-        motion_eq = LM.form_lagranges_equations()
-        rhs = LM.rhs()
-
-        # Salva as Equação em formato fácil de se obter Solução já com os Parâmetros
-        dummys = [Dummy() for i in symb_dynamics]
-        rhs = msubs(rhs, dict(zip(symb_params, self.num_params)))
-        dummydict = dict(zip(symb_dynamics, dummys))
-        rhs = msubs(rhs, dummydict)
-
-        # Lambdify as equações
-        for f in rhs:
-            self.rhs_lambdified.append(lambdify(dummys, f))
-
-        # Salva as equações lambidificadas e já com as constantes subtituídas no disco
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        dill.dump(self.rhs_lambdified, open(file_name, "wb"))
-        print("Modelo calculado e salvo em " + file_name + ".Tempo: " +
-               str(time.time() - initial_time))
+        # Método de Lagrange, com a simplificação direcionada no lugar do simplify()
+        with derivacao.stage('Lagrangiano'):
+            L = simplify_trig(Lagrangian(B0, E))
+        with derivacao.stage('Equações de Lagrange'):
+            LM = LagrangesMethod(L, [theta], frame=B0, forcelist = FL)        
+            motion_eq = LM.form_lagranges_equations()
+            rhs = LM.rhs()
+
+        with derivacao.stage('Jacobiano'):
+            # Salva as Equação em formato fácil de se obter Solução, com os Parâmetros
+            # mantidos simbólicos para serem passados como argumentos a cada avaliação
+            dummys = [Dummy() for i in symb_dynamics]
+            dummydict = dict(zip(symb_dynamics, dummys))
+            rhs = msubs(rhs, dummydict)
+            mass_matrix = msubs(LM.mass_matrix, dummydict)
+            jacobian = rhs.jacobian(dummys[:2])
+
+        # Lambdify as equações em uma única função que retorna o vetor de estados derivado
+        # As equações lambidificadas são válidas para quaisquer parâmetros, o código
+        # em C do backend compilado é gerado junto e salvo no mesmo arquivo
+        args = (dummys[:2], dummys[2:], list(symb_params))
+        with derivacao.stage('Lambdify'):
+            model = {
+                "rhs": lambdify(dummys + list(symb_params), Array(list(rhs)), modules='numpy', cse=True),
+                "jacobian": lambdify(dummys + list(symb_params), jacobian, modules='numpy', cse=True),
+            }
+        with derivacao.stage('Código C'):
+            model["c_code"] = generate_source("rotatingarm_dynamics", args, rhs, mass_matrix, jacobian)
+        derivacao.report()
+        return model
 
     # Função utilizada pelo solver da EDO 
     def f_ode(self, t, y):
         """"Função no formato utilizado pelo solver da EDO"""
         theta, omega = y
         T = self.torque
-        # Lista com a conversão da equação diferencial do Sympy em função solucionável do Scipy
-        return [f(theta, omega, T) for f in self.rhs_lambdified]
+        if self.c_model is not None:
+            return self.c_model.rhs(y, (T,), self.num_params)
+        # Equação diferencial do Sympy convertida em uma única função solucionável pelo Scipy
+        return self.rhs_lambdified(theta, omega, T, *self.num_params)
+
+    # Jacobiano analítico utilizado pelos solvers implícitos da EDO
+    def f_jac(self, t, y):
+        """Jacobiano da função f_ode em relação aos estados [theta, omega]"""
+        theta, omega = y
+        T = self.torque
+        if self.c_model is not None:
+            return self.c_model.jacobian(y, (T,), self.num_params)
+        return self.jac_lambdified(theta, omega, T, *self.num_params)
 
     def set_params(self, parameters):
-        """ Atualiza os parâmetros atuais sendo usando no manipulador"""
-        self.solution = False
-        self.num_params = parameters
+        """ Atualiza os parâmetros atuais sendo usando no manipulador,
+        (L, R, I, M, G), sem recalcular a dinâmica"""
+        self.solution_edo = False
+        self.num_params = tuple(parameters)
 
     def position(self, theta):
         """ Retorna a posição (x,y) atual da ponta do manipulador"""
@@ -146,13 +189,34 @@ class Manipulador1GdL:
         y = np.cumsum([self.origin[1], -L * sin(theta)])
         return (x, y)
 
+    def positions(self, thetas):
+        """ Retorna as posições (x,y) da base e da ponta do manipulador para uma
+        trajetória inteira de thetas, no formato (T, 2, 2)"""
+        L = self.num_params[0]
+        thetas = np.asarray(thetas, dtype='float')
+        points = np.empty(thetas.shape + (2, 2))
+        points[..., :, 0] = self.origin[0]
+        points[..., :, 1] = self.origin[1]
+        points[..., 1, 0] += L * cos(thetas)
+        points[..., 1, 1] -= L * sin(thetas)
+        return points
+
+    def _jac_option(self):
+        """Jacobiano analítico para os métodos implícitos, que o utilizam"""
+        if self.edo_method in IMPLICIT_METHODS:
+            return {"jac": self.f_jac}
+        return {}
+
     def solve_edo(self, dt = 20):
         """Executa solução para o modelo em um intervalor de tempo dt"""
+        # O Scipy é importado apenas aqui, a integração em lote não depende dele
+        from scipy.integrate import solve_ivp
         # Postos que a função será avaliada
         self.time = np.arange(0, dt, self.fps)
         try:
             # Solucionador padrão de EDO do Scipy
-            solution = solve_ivp(self.f_ode, (0, dt), self.init_state, method=self.edo_method, t_eval=self.time)
+            solution = solve_ivp(self.f_ode, (0, dt), self.init_state, method=self.edo_method,
+                                 t_eval=self.time, **self._jac_option())
             self.thetas = solution.y[0]
             self.omegas = solution.y[1]
             self.time = solution.t
@@ -168,13 +232,14 @@ class Manipulador1GdL:
             print("As soluções da EDOs devem ser calculadas antes!")
             return
 
+        # O Matplotlib só é importado quando a animação é exibida
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+
         #------ GRÁFICOS E ANIMAÇÃO ------#
         # Variáveis iniciais
         dt = self.fps           # fps
-        thetas = []             # Estados dos thetas a cada iteração
-        omegas = []             # Estados dos omegas a cada iteração
-        times = []              # Tempo de cada iteração
-        
+
         # Figura
         fig = plt.figure(figsize=(10, 5))
 
@@ -212,6 +277,9 @@ class Manipulador1GdL:
         line_state_omega, = state_ax_2.plot([], [], 'm-', lw=2, label=r"$\dot{\theta}$")
         state_ax_2.legend()
 
+        # Posições do manipulador em toda a trajetória, calculadas de uma só vez
+        positions = self.positions(self.thetas)
+
         # Funções necessárias para a animação pelo matplolib
         def init():
             """initialize animation"""
@@ -224,13 +292,9 @@ class Manipulador1GdL:
         
         def animate(i):
             """perform animation step"""
-            theta = self.thetas[i]
-            omega = self.omegas[i]
             t_ = self.time[i]
-            # Atualiza os dados
-            thetas.append(theta)
-            omegas.append(omega)
-            times.append(t_)
+            # Views dos estados até o quadro atual, sem cópias
+            times = self.time[:i + 1]
             xmin, xmax = state_ax_1.get_xlim()
             
             # Ajusta o eixo do tempo, x
@@ -240,9 +304,9 @@ class Manipulador1GdL:
                 state_ax_1.figure.canvas.draw()
             
             # Atualiza os objetos desenhados com os dados obtidos
-            line_anim.set_data(self.position(theta))
-            line_state_theta.set_data(times, thetas)
-            line_state_omega.set_data(times, omegas)
+            line_anim.set_data(positions[i, :, 0], positions[i, :, 1])
+            line_state_theta.set_data(times, self.thetas[:i + 1])
+            line_state_omega.set_data(times, self.omegas[:i + 1])
             time_text.set_text('Tempo = %.1f' % t_)
             
             return line_anim, line_state_theta, line_state_omega, time_text
@@ -256,9 +320,10 @@ class Manipulador1GdL:
 
 
 #-------- EXECUÇÃO ---------#
-# Inicializa a classe
-#manipulador = Manipulador1GdL([30, 0], edo_method='RK45')
-manipulador = Manipulador1GdL([0, 0], edo_method='RK45')
-#manipulador.solve_dynamics()
-manipulador.solve_edo(20)
-manipulador.simulate_model()
+if __name__ == "__main__":
+    # Inicializa a classe
+    #manipulador = Manipulador1GdL([30, 0], edo_method='RK45')
+    manipulador = Manipulador1GdL([0, 0], edo_method='RK45')
+    #manipulador.solve_dynamics()
+    manipulador.solve_edo(20)
+    manipulador.simulate_model()
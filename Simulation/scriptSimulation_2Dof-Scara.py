@@ -9,16 +9,24 @@ email: nandohfernandes@gmail.com
 """
 
 from numpy import sin, cos, pi
-import dill, os, time
+import os
+import sys
+import time
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint, solve_ivp
-from scipy.misc import derivative
-import matplotlib.animation as animation
-from sympy import symbols, pprint, simplify, Derivative, lambdify, Dummy
-from sympy.physics.mechanics import *
-from sympy.physics.mechanics.functions import inertia
-dill.settings['recurse'] = True
+# Módulo de derivação simbólica compartilhado com a cinemática
+KINEMATICS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'Kinematics')
+sys.path.append(KINEMATICS_DIR)
+from integrators import rk4_batch
+from model_cache import ModelCache
+from c_backend import CModel
+import c_backend
+
+# Módulos utilizados por derive_dynamics(), cujo código também identifica o modelo
+# no cache: alterações neles não reutilizam modelos ou códigos em C antigos
+MODEL_DEPENDENCIES = (c_backend.__file__, os.path.join(KINEMATICS_DIR, 'symbolic.py'))
+
+# Métodos da EDO que utilizam o Jacobiano, os demais ignoram o argumento jac
+IMPLICIT_METHODS = ('LSODA', 'Radau', 'BDF')
 
 class Manipulador2GdL:
     """Classe do Manipulador de 2 Grau de Liberdade
@@ -42,8 +50,13 @@ class Manipulador2GdL:
                  edo_method = 'LSODA',        # Método de resolução da EDO (LSODA=0, RK45=1)
                                               #     OBS.: LSODA é consideravelmente mais rápido,
                                               #     principalmente no caso com atrito.
-                 origin = (0, 0)):
+                 backend = 'numpy',           # Backend das equações ('numpy' ou 'c', compilado em C)
+                 origin = (0, 0),
+                 workers = 1):                # Processos da derivação simbólica, caso o modelo
+                                              #     ainda não esteja no cache
         self.edo_method = edo_method
+        self.backend = backend
+        self.workers = workers
         self.init_state = np.deg2rad(np.asarray(init_state, dtype='float'))
         self.num_params = (L1, L2, R1, R2, I1, I2, M1, M2, G)
         self.torque = [T1, T2]
@@ -54,7 +67,15 @@ class Manipulador2GdL:
         self.omegas_1 = []
         self.omegas_2 = []
         self.time = []        
-        self.rhs_lambdified = []
+        self.rhs_lambdified = None
+        self.jac_lambdified = None
+        self.model_terms = None
+        self.c_model = None
+        # Controle por torque computado, desativado até set_control()
+        self.trajectory = None
+        self.gains = (0.0, 0.0)
+        # Parâmetros do modelo do controlador, None utiliza os da planta
+        self.model_params = None
         # frames por segundo da animação
         self.fps = 1./60    
         self.solution_edo = False
@@ -65,8 +86,44 @@ class Manipulador2GdL:
 
     # Solução da Dinâmica do Manipulador
     def solve_dynamics(self):    
+        """Carrega a solução da dinâmica do manipulador do cache em disco, ou a
+        calcula caso ela ainda não exista"""
+        # O número de processos não altera o modelo e não faz parte da chave do cache
+        model = ModelCache().load_or_build("scara_dynamics", self.derive_dynamics,
+                                           MODEL_DEPENDENCIES, workers=self.workers)
+        self.rhs_lambdified = model["rhs"]
+        self.jac_lambdified = model["jacobian"]
+        # Termos M(q), C(q, q')q', g(q) e B utilizados pelo controle
+        self.model_terms = (model["mass_matrix"], model["coriolis"], model["gravity"],
+                            model["input_matrix"])
+        self.c_model = None
+        if self.backend == 'c':
+            try:
+                self.c_model = CModel(model["c_code"])
+            except (OSError, RuntimeError, AttributeError) as error:
+                print("Backend em C indisponível, utilizando o NumPy. " + str(error))
+
+    @staticmethod
+    def derive_dynamics(workers=1):
         """Calcula a solução da dinâmica do manipulador e já coloca em
-         formato pronto para ser calculado """
+         formato pronto para ser calculado
+
+        * workers: número de processos entre os quais as equações de cada junta e
+            o código de cada função são distribuídos. Por padrão a derivação é feita
+            neste processo, que para os 2 GdL do SCARA é mais rápido que iniciar o pool
+        """
+        # O Sympy só é importado quando o modelo ainda não está no cache
+        from sympy import symbols, lambdify, Dummy, Array, Matrix
+        from sympy.physics.mechanics import (dynamicsymbols, ReferenceFrame, Point, RigidBody,
+                                             Lagrangian, inertia, msubs)
+        from functools import partial
+        from c_backend import generate_source
+        from symbolic import (Derivacao, simplify_trig, lagrange_equations, parallel_jacobian,
+                              parallel_cse, parallel_map, process_pool)
+
+        # Tempo de cada etapa, exibido ao fim da derivação
+        derivacao = Derivacao('Dinâmica do SCARA')
+
         # Variáveis Simbólicas do problema
         theta_1, theta_2 = dynamicsymbols('theta_1 theta_2')
         dtheta_1, dtheta_2 = dynamicsymbols('theta_1 theta_2', 1)
@@ -78,17 +135,6 @@ class Manipulador2GdL:
         m_1, m_2, g = symbols('m_1 m_2 g')
         I_zz_1, I_zz_2 = symbols('I_{1zz} I_{2zz}') 
         symb_params = (l_1, l_2, r_1, r_2, I_zz_1, I_zz_2, m_1, m_2, g)
-        # Nome do arquivo salvo com a equação do movimento
-        here = os.path.dirname(os.path.realpath(__file__))
-        file_name = (here + "\\models\\scara_dynamics_" + 
-                    "".join(str(e) + "_" for e in self.num_params) + ".data")
-        try:
-            rhs = dill.load(open(file_name, "rb"))
-            self.rhs_lambdified = rhs
-            return
-        except:
-            print("Modelo dinâmico ainda não foi calculado para esses parâmetros. Aguarde...")
-        initial_time = time.time()
 
         # Referenciais 
         B0 = ReferenceFrame('B0')                 # Referencial Parado
@@ -121,59 +167,220 @@ class Manipulador2GdL:
         r_1_CM = CM_1.pos_from(O).express(B0)
         E_1.potential_energy = r_1_CM.dot(P_1)
         P_2 = -m_2 * g * B0.y
-        r_2_CM = CM_2.pos_from(O).express(B0).simplify()
+        r_2_CM = CM_2.pos_from(O).express(B0)
         E_2.potential_energy = r_2_CM.dot(P_2)
 
         # Forças/Momentos Generalizados
         FL = [(B1, tau_1 * B1.z), (B2, tau_2 * B2.z)]
-        # Método de Lagrange
-        L = Lagrangian(B0, E_1, E_2).simplify()
-        LM = LagrangesMethod(L, [theta_1, theta_2], frame=B0, forcelist=FL)
-        motion_eq = LM.form_lagranges_equations()
-        rhs = LM.rhs()
-        # Salva as Equação em formato fácil de se obter Solução já com os Parâmetros
-        dummys = [Dummy() for i in symb_dynamics]
-        rhs = msubs(rhs, dict(zip(symb_params, self.num_params)))
-        dummydict = dict(zip(symb_dynamics, dummys))
-        rhs = msubs(rhs, dummydict)
-        
-        # Lambdify as equações
-        for f in rhs:
-            self.rhs_lambdified.append(lambdify(dummys, f))
 
-        # Salva as equações lambidificadas e já com as constantes subtituídas no disco
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        dill.dump(self.rhs_lambdified, open(file_name, "wb"))
+        # Método de Lagrange, com a simplificação direcionada no lugar do simplify()
+        with derivacao.stage('Lagrangiano'):
+            L = simplify_trig(Lagrangian(B0, E_1, E_2))
+        # Um único pool de processos é compartilhado por todas as etapas seguintes
+        with process_pool(workers) as executor:
+            # A equação de cada junta é derivada e simplificada (M e o vetor de forças,
+            # antes da solução) em um processo
+            with derivacao.stage('Equações de Lagrange'):
+                mass_matrix, forcing = lagrange_equations(L, [theta_1, theta_2], FL, B0,
+                                                          [tau_1, tau_2], executor)
+            with derivacao.stage('Solução de M q\'\' = forças'):
+                rhs = Matrix([dtheta_1, dtheta_2]).col_join(mass_matrix.LUsolve(forcing))
+
+            with derivacao.stage('Jacobiano e separação dos termos'):
+                # Salva as Equação em formato fácil de se obter Solução, com os Parâmetros
+                # mantidos simbólicos para serem passados como argumentos a cada avaliação
+                dummys = [Dummy() for i in symb_dynamics]
+                dummydict = dict(zip(symb_dynamics, dummys))
+                rhs = msubs(rhs, dummydict)
+                mass_matrix = msubs(mass_matrix, dummydict)
+                jacobian = parallel_jacobian(rhs, dummys[:4], executor)
+                # M(q) q'' = B tau - C(q, q') q' - g(q), os termos são separados a partir do
+                # vetor de forças generalizadas. B não é a identidade pois tau_2 atua no
+                # referencial B2 e contribui também com a equação de theta_1
+                forcing = msubs(forcing, dummydict)
+                input_matrix = parallel_jacobian(forcing, dummys[4:], executor)
+                no_torque = {dummys[4]: 0, dummys[5]: 0}
+                coriolis = -forcing.subs(no_torque).subs(g, 0)
+                gravity = -forcing.subs(no_torque).subs({dummys[2]: 0, dummys[3]: 0})
 
-        print("Modelo calculado e salvo em " + file_name + ".Tempo: " +
-               str(time.time() - initial_time))
+            # Lambdify as equações em uma única função que retorna o vetor de estados
+            # derivado, com as subexpressões comuns (inversa da matriz de massa, senos
+            # e cossenos) calculadas apenas uma vez por avaliação
+            # As equações lambidificadas são válidas para quaisquer parâmetros, o código
+            # em C do backend compilado é gerado junto e salvo no mesmo arquivo
+            args = (dummys[:4], dummys[4:], list(symb_params))
+            # Os termos do controle dependem apenas dos estados e dos parâmetros
+            state_args = dummys[:4] + list(symb_params)
+            # As subexpressões comuns de cada função são eliminadas em um processo, e o
+            # lambdify apenas escreve o código com o resultado
+            with derivacao.stage('Lambdify'):
+                functions = {
+                    "rhs": (dummys + list(symb_params), Array(list(rhs))),
+                    "jacobian": (dummys + list(symb_params), jacobian),
+                    "mass_matrix": (state_args, mass_matrix),
+                    "coriolis": (state_args, Array(list(coriolis))),
+                    "gravity": (state_args, Array(list(gravity))),
+                    "input_matrix": (state_args, input_matrix),
+                }
+                cses = parallel_cse([expr for _, expr in functions.values()], executor)
+                model = {}
+                for (name, (function_args, expr)), function_cse in zip(functions.items(), cses):
+                    model[name] = lambdify(function_args, expr, modules='numpy', cse=function_cse)
+            with derivacao.stage('Código C'):
+                model["c_code"] = generate_source(
+                    "scara_dynamics", args, rhs, mass_matrix, jacobian,
+                    map_function=partial(parallel_map, executor=executor),
+                    coriolis=coriolis, gravity=gravity, input_matrix=input_matrix)
+        derivacao.report()
+        return model
 
     # Função utilizada pelo solver da EDO
     def f_ode(self, t, y):
+        theta_1, theta_2, omega_1, omega_2 = y
+        torque = self.torque
+        if self.trajectory is not None:
+            # O controle atua dentro da própria EDO, a cada avaliação do solver, sem
+            # alterar o torque constante definido em self.torque
+            torque = self.computed_torque(t, y)
+        T1, T2 = torque
+        if self.c_model is not None:
+            return self.c_model.rhs(y, torque, self.num_params)
+        # Equação diferencial do Sympy convertida em uma única função solucionável pelo Scipy
+        return self.rhs_lambdified(theta_1, theta_2, omega_1, omega_2, T1, T2, *self.num_params)
+
+    # Jacobiano analítico utilizado pelos solvers implícitos da EDO
+    def f_jac(self, t, y):
+        """Jacobiano da função f_ode em relação aos estados [theta_1, theta_2, omega_1, omega_2]"""
         theta_1, theta_2, omega_1, omega_2 = y
         T1, T2 = self.torque
-        # Lista com a conversão da equação diferencial do Sympy em função solucionável do Scipy
-        return [f(theta_1, theta_2, omega_1, omega_2, T1, T2) for f in self.rhs_lambdified]
+        if self.c_model is not None:
+            return self.c_model.jacobian(y, self.torque, self.num_params)
+        return self.jac_lambdified(theta_1, theta_2, omega_1, omega_2, T1, T2, *self.num_params)
+
+    def set_control(self, trajectory, lamb=5):
+        """Ativa o controle por torque computado, que leva o manipulador à trajetória
+
+        * trajectory: objeto com o método evaluate(t), que retorna as posições,
+            velocidades e acelerações alvo [theta_1, theta_2] em radianos, como as
+            trajetórias de Control/trajectories.py. None desativa o controle
+        * lamb: valor lambda da equação diferencial do erro de cada junta,
+            e'' + 2 lambda e' + lambda^2 e = 0, como no manipulador de 1 GdL
+        """
+        self.solution_edo = False
+        self.trajectory = trajectory
+        self.gains = (lamb ** 2, 2 * lamb)
+
+    def model_torques(self, y, qdd):
+        """Torques [T1, T2] que produzem as acelerações qdd no estado
+        y = [theta_1, theta_2, omega_1, omega_2], solução de
+        B tau = M(q) q'' + C(q, q') q' + g(q), com os parâmetros do modelo
+        do controlador"""
+        params = self.num_params if self.model_params is None else self.model_params
+        if self.c_model is not None:
+            c_model, args = self.c_model, (y, self.torque, params)
+            M = c_model.mass_matrix(*args)
+            bias = c_model.coriolis(*args) + c_model.gravity(*args)
+            B = c_model.input_matrix(*args)
+        else:
+            mass_matrix, coriolis, gravity, input_matrix = self.model_terms
+            M = mass_matrix(*y, *params)
+            bias = coriolis(*y, *params) + gravity(*y, *params)
+            B = input_matrix(*y, *params)
+        return np.linalg.solve(B, M @ qdd + bias)
+
+    def model_torques_batch(self, y, qdd):
+        """model_torques() para N estados y (N, 4) e acelerações qdd (N, 2) de uma só
+        vez, com os termos do modelo avaliados em lote e os N sistemas B tau = ...
+        resolvidos em uma única chamada. Retorna os torques no formato (N, 2)"""
+        params = self.num_params if self.model_params is None else self.model_params
+        n = len(y)
+        if self.c_model is not None:
+            c_model, args = self.c_model, (y, np.zeros((n, 2)), params)
+            M = c_model.mass_matrix.batch(*args)
+            bias = c_model.coriolis.batch(*args) + c_model.gravity.batch(*args)
+            B = c_model.input_matrix.batch(*args)
+        else:
+            mass_matrix, coriolis, gravity, input_matrix = self.model_terms
+            # Parâmetros repetidos para cada estado, assim todos os elementos que não
+            # são constantes são arrays (N,), e as matrizes constantes são repetidas
+            args = list(y.T) + [np.full(n, p) for p in params]
+            batch = lambda value, shape: (
+                np.broadcast_to(value, (n,) + shape) if np.shape(value) == shape
+                else np.moveaxis(np.asarray(value, dtype='float'), -1, 0))
+            M = batch(mass_matrix(*args), (2, 2))
+            bias = batch(coriolis(*args), (2,)) + batch(gravity(*args), (2,))
+            B = batch(input_matrix(*args), (2, 2))
+        rhs = np.einsum('nij,nj->ni', M, qdd) + bias
+        return np.linalg.solve(B, rhs[..., None])[..., 0]
+
+    def computed_torque(self, t, y):
+        """Lei de controle por torque computado no instante t e estado y"""
+        q_target, qd_target, qdd_target = self.trajectory.evaluate(t)
+        kp, kd = self.gains
+        # Acelerações desejadas com a realimentação dos erros de posição e velocidade
+        qdd = (qdd_target - kd * (np.asarray(y[2:]) - qd_target) -
+               kp * (np.asarray(y[:2]) - q_target))
+        return self.model_torques(y, qdd)
+
+    def computed_torques_batch(self, t, y):
+        """computed_torque() para N estados y (N, 4) no instante t, com a trajetória
+        avaliada uma única vez"""
+        q_target, qd_target, qdd_target = self.trajectory.evaluate(t)
+        kp, kd = self.gains
+        qdd = qdd_target - kd * (y[:, 2:] - qd_target) - kp * (y[:, :2] - q_target)
+        return self.model_torques_batch(y, qdd)
 
     def set_params(self, parameters):
-        """ Atualiza os parâmetros atuais sendo usando no manipulador"""
-        self.params = parameters
+        """ Atualiza os parâmetros atuais sendo usando no manipulador, 
+        (L1, L2, R1, R2, I1, I2, M1, M2, G), sem recalcular a dinâmica"""
+        self.solution_edo = False
+        self.num_params = tuple(parameters)
+
+    def set_model_params(self, parameters):
+        """ Atualiza os parâmetros do modelo utilizado pelo controle por torque
+        computado, sem alterar a planta. None volta a utilizar os da planta"""
+        self.solution_edo = False
+        self.model_params = None if parameters is None else tuple(parameters)
 
     def position(self, theta1, theta2):
         """ Retorna a posição (x,y) atual da ponta do manipulador"""
+        points = self.positions(theta1, theta2)
+        return (points[:, 0], points[:, 1])
+
+    def positions(self, thetas_1, thetas_2):
+        """ Retorna as posições (x,y) da base, da junta e da ponta do manipulador para
+        trajetórias inteiras de thetas_1 e thetas_2, no formato (T, 3, 2)"""
         L1 = self.num_params[0]
         L2 = self.num_params[1]
-        x = np.cumsum([self.origin[0], L1 * cos(theta1), L2 * cos(theta1 + theta2)])
-        y = np.cumsum([self.origin[1], -L1 * sin(theta1), -L2 * sin(theta1 + theta2)])
-        return (x,y)
+        thetas_1 = np.asarray(thetas_1, dtype='float')
+        thetas_12 = thetas_1 + np.asarray(thetas_2, dtype='float')
+        points = np.empty(thetas_12.shape + (3, 2))
+        points[..., 0, :] = self.origin
+        points[..., 1, 0] = L1 * cos(thetas_1)
+        points[..., 1, 1] = -L1 * sin(thetas_1)
+        points[..., 2, 0] = L2 * cos(thetas_12)
+        points[..., 2, 1] = -L2 * sin(thetas_12)
+        # Soma acumulada dos vetores dos elos, feita no próprio array
+        return np.cumsum(points, axis=-2, out=points)
+
+    def _jac_option(self):
+        """Jacobiano analítico para os métodos implícitos, que o utilizam. Com o
+        controle ativo os torques dependem do estado e o Jacobiano da malha
+        aberta não é válido, nesse caso o solver o estima numericamente"""
+        if self.edo_method in IMPLICIT_METHODS and self.trajectory is None:
+            return {"jac": self.f_jac}
+        return {}
 
     def solve_edo(self, dt = 10):
         """Executa asimulaçao do modelo em um intervalor de tempo dt"""
+        # O Scipy é importado apenas aqui, a integração em lote não depende dele
+        from scipy.integrate import solve_ivp
         # Postos que a função será avaliada
         self.time = np.arange(0, dt, self.fps)
         try:
             # Solucionador padrão de EDO do Scipy
-            solution = solve_ivp(self.f_ode, (0, dt), self.init_state, method=self.edo_method, t_eval=self.time)
+            solution = solve_ivp(self.f_ode, (0, dt), self.init_state, method=self.edo_method,
+                                 t_eval=self.time, **self._jac_option())
             self.thetas_1 = solution.y[0]
             self.thetas_2 = solution.y[1]
             self.omegas_1 = solution.y[2]
@@ -183,6 +390,41 @@ class Manipulador2GdL:
             print("A EDO não pôde ser selecionada, verifique se a solução da dinâmica" +
                   "do corpo já foi calculada através do método solve_dynamics().")
 
+    def solve_edo_batch(self, init_states, dt = 10, torques = None, substeps = 4):
+        """Executa a simulação de N estados iniciais ao mesmo tempo em um intervalo de tempo dt
+
+        * init_states: estados iniciais no formato (N, 4), em graus ou rad/s como em init_state
+        * torques: torques [T1, T2] de cada trajetória no formato (N, 2). Caso não seja
+            informado, é usado o torque atual do manipulador em todas as trajetórias.
+            Com o controle ativo (set_control) os torques são os do controle por torque
+            computado de cada trajetória e não devem ser informados
+        * substeps: passos do Runge-Kutta de 4ª ordem entre dois quadros da animação
+
+        Retorna os estados de cada trajetória no formato (N, 4, T), avaliados em self.time.
+        """
+        self.time = np.arange(0, dt, self.fps)
+        y0 = np.deg2rad(np.asarray(init_states, dtype='float').reshape(-1, 4))
+        if self.trajectory is not None and torques is not None:
+            raise ValueError("Com o controle ativo os torques são calculados pelo controlador, "
+                             "desative-o com set_control(None) para informar os torques.")
+        if torques is None:
+            torques = self.torque
+        torques = np.broadcast_to(np.asarray(torques, dtype='float'), (len(y0), 2))
+
+        def f_ode_batch(t, y):
+            u = torques
+            if self.trajectory is not None:
+                # Torque computado de todas as trajetórias no instante t, em lote
+                u = self.computed_torques_batch(t, y)
+            if self.c_model is not None:
+                return self.c_model.rhs.batch(y, u, self.num_params)
+            # Todas as trajetórias são avaliadas em uma única chamada da função lambdificada
+            theta_1, theta_2, omega_1, omega_2 = y.T
+            return self.rhs_lambdified(theta_1, theta_2, omega_1, omega_2, u[:, 0], u[:, 1],
+                                       *self.num_params).T
+
+        return rk4_batch(f_ode_batch, self.time, y0, substeps)
+
     def simulate_model(self):
         """Simula o manipulador a partir das equações dinâmicas"""
         # Verifica se existe solução calculada
@@ -190,14 +432,13 @@ class Manipulador2GdL:
             print("As soluções da EDOs devem ser calculadas antes!")
             return
 
+        # O Matplotlib só é importado quando a animação é exibida
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+
         #------ GRÁFICOS E ANIMAÇÃO ------#
         # Variáveis iniciais
         dt = self.fps       # fps
-        thetas_1 = []       # Estados dos thetas
-        thetas_2 = []       # Estados dos thetas
-        omegas_1 = []       # Estados dos omegas
-        omegas_2 = []       # Estados dos omegas
-        times = []          # Tempo de cada iteração
         
         # Figura
         fig = plt.figure(figsize=(10, 5))
@@ -239,6 +480,9 @@ class Manipulador2GdL:
         line_state_omega_2, = state_ax_2.plot([], [], 'tab:red', lw=2, label=r"$\dot{\theta_2}$")
         state_ax_2.legend()
 
+        # Posições do manipulador em toda a trajetória, calculadas de uma só vez
+        positions = self.positions(self.thetas_1, self.thetas_2)
+
         # Funções necessárias para a animação pelo matplolib
         def init():
             """initialize animation"""
@@ -253,17 +497,9 @@ class Manipulador2GdL:
         
         def animate(i):
             """perform animation step"""
-            theta_1 = self.thetas_1[i]
-            theta_2 = self.thetas_2[i]
-            omega_1 = self.omegas_1[i]
-            omega_2 = self.omegas_2[i]
             t_ = self.time[i]
-            # Atualiza os dados
-            thetas_1.append(theta_1)
-            thetas_2.append(theta_2)
-            omegas_1.append(omega_1)
-            omegas_2.append(omega_2)
-            times.append(t_)
+            # Views dos estados até o quadro atual, sem cópias
+            times = self.time[:i + 1]
             xmin, xmax = state_ax_1.get_xlim()
             
             # Ajusta o eixo do tempo, x
@@ -273,11 +509,11 @@ class Manipulador2GdL:
                 state_ax_1.figure.canvas.draw()
             
             # Atualiza os objetos desenhados com os dados obtidos
-            line_anim.set_data(self.position(theta_1, theta_2))
-            line_state_theta_1.set_data(times, thetas_1)
-            line_state_theta_2.set_data(times, thetas_2)
-            line_state_omega_1.set_data(times, omegas_1)
-            line_state_omega_2.set_data(times, omegas_2)
+            line_anim.set_data(positions[i, :, 0], positions[i, :, 1])
+            line_state_theta_1.set_data(times, self.thetas_1[:i + 1])
+            line_state_theta_2.set_data(times, self.thetas_2[:i + 1])
+            line_state_omega_1.set_data(times, self.omegas_1[:i + 1])
+            line_state_omega_2.set_data(times, self.omegas_2[:i + 1])
             time_text.set_text('Tempo = %.1f' % t_)
             
             return line_anim, line_state_theta_1, line_state_theta_2, line_state_omega_1, line_state_omega_2, time_text
@@ -295,7 +531,28 @@ class Manipulador2GdL:
 
 
 #-------- EXECUÇÃO ---------#
-# Inicializa a classe
-manipulador = Manipulador2GdL([30, 0, 0, 0], edo_method='RK45')
-manipulador.solve_edo(20)
-manipulador.simulate_model()
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulação do SCARA")
+    parser.add_argument("--headless", action="store_true",
+                        help="apenas resolve a EDO e exibe um resumo, sem animação")
+    parser.add_argument("--control", action="store_true",
+                        help="controla o manipulador por torque computado")
+    args = parser.parse_args()
+
+    # Inicializa a classe
+    manipulador = Manipulador2GdL([30, 0, 0, 0], edo_method='RK45')
+    if args.control:
+        # Trajetórias de referência dos scripts de controle
+        import os, sys
+        sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Control"))
+        from trajectories import PerfilCurvaS
+        manipulador.set_control(PerfilCurvaS([0, 0], [pi / 2, -pi / 2], v_max=2.0, a_max=4.0,
+                                             j_max=20.0, t0=1.0), lamb=8)
+    manipulador.solve_edo(20)
+    if args.headless:
+        print("Passos simulados:", len(manipulador.time))
+        print("Estado final [thetas, omegas]:", manipulador.thetas_1[-1], manipulador.thetas_2[-1],
+              manipulador.omegas_1[-1], manipulador.omegas_2[-1])
+    else:
+        manipulador.simulate_model()